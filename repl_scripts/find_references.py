@@ -43,8 +43,7 @@ def guess_keys(resource_config, entries, key_threshold=0.95):
 
 resource_config = resource_queries.by_resource_id("salex").config
 entries = list(entry_queries.all_entries("salex", expand_plugins=False))
-# with open("entries.pickle", "rb") as file:
-#    entries = pickle.load(file)
+# entries = read_snapshot("salex.snapshot").entries  # from utils.snapshot
 
 for key, values in guess_keys(resource_config, entries).items():
     print(key, len(values))
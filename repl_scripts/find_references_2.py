@@ -1,5 +1,5 @@
-import pickle
 import re
+from utils.snapshot import read_snapshot
 
 
 def guess_keys(data, path=[]):
@@ -27,8 +27,7 @@ def guess_keys_entries(entries):
             yield kind, ".".join(path)
 
 
-with open("entries.pickle", "rb") as file:
-    entries = pickle.load(file)
+entries = read_snapshot("salex.snapshot").entries
 
 for kind, path in set(guess_keys_entries(entries)):
     print(path, kind)
@@ -1,7 +1,7 @@
 from utils.testing import (
     write_test_reports_excel,
     write_test_reports_html,
-    make_test_reports,
+    make_test_report,
     read_test_reports_excel,
     replace_comments,
     remove_old_warnings,
@@ -32,21 +32,29 @@ from test_scripts.so_definitions import test_so_definitions
 from test_scripts.so_endings import test_so_endings
 from tqdm import tqdm
 from utils.inflection import Inflection
+from utils.sources import KarpSource, JsonlSource, SnapshotSource
+from utils.parallel import run_tests_parallel
+from utils.salex import visible_entry, entry_hidden_prefixes, SO, SAOL
+from utils.visitor import EntryWalk
+from utils.timing import RunStatistics, func_name, run_test
+from utils.incremental import TestCache, is_per_entry
+from utils.indexes import Indexes
+from utils.sharding import Shard, ShardResult, merge_shards
+from utils.spool import WarningSpool
+from datetime import datetime
 from itertools import islice
 from pathlib import Path
+import sys
 import typer
 from functools import partial
 from typing import Optional, Annotated
 
 
-def func_name(func):
-    if isinstance(func, partial):
-        return func_name(func.func)
-    else:
-        return func.__name__
+app = typer.Typer()
 
 
-def main(
+@app.command()
+def run(
     output_directory: Annotated[
         Path, typer.Option("--output-directory", "-o", help="output directory", show_default=False)
     ],
@@ -58,41 +66,108 @@ def main(
     test: Annotated[Optional[str], typer.Option(help="which test to run", show_default="all")] = None,
     old_report: Annotated[Optional[str], typer.Option(help="old test report for comments", show_default="all")] = None,
     diff: Annotated[bool, typer.Option(help="only show warnings not in old report", show_default="all")] = False,
+    snapshot: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="read entries from this snapshot, creating it if it doesn't exist. "
+            "Changes made in the database since then aren't seen until --refresh-snapshot is used"
+        ),
+    ] = None,
+    refresh_snapshot: Annotated[bool, typer.Option(help="recreate the snapshot from the database")] = False,
+    jsonl: Annotated[
+        Optional[Path], typer.Option(help="read entries from a JSONL export instead of the database")
+    ] = None,
+    resource_config_file: Annotated[
+        Optional[Path], typer.Option("--resource-config", help="resource config (JSON) to use with --jsonl")
+    ] = None,
+    inflection_rules_file: Annotated[
+        Optional[Path], typer.Option("--inflection-rules", help="inflection rules (JSONL) to use with --jsonl")
+    ] = None,
+    jobs: Annotated[int, typer.Option("--jobs", "-j", help="number of tests to run in parallel")] = 1,
+    cache: Annotated[
+        Optional[Path], typer.Option(help="remember warnings here, and only recheck entries changed since last time")
+    ] = None,
+    shard: Annotated[
+        Optional[str],
+        typer.Option(
+            help="only check part i of N (given as i/N) of the entries, and write a file for merge. "
+            "Tests that need all entries at once (e.g. test_word_segmentation, test_references) "
+            "aren't split, but run in full by one of the shards"
+        ),
+    ] = None,
 ):
+    """Run the tests and write the test reports."""
+
+    if shard is not None:
+        try:
+            shard = Shard.parse(shard)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--shard")
+
     output_directory.mkdir(exist_ok=True)
 
-    resource_config = resource_queries.by_resource_id("salex", expand_plugins=False).config
-    entries = list(
-        tqdm(
-            islice(entry_queries.all_entries("salex", expand_plugins=False), first_entry, last_entry),
-            desc="Reading entries",
-        )
-    )
+    statistics = RunStatistics(jobs=jobs)
+
+    with statistics.measure("load_entries"):
+        if snapshot is not None and snapshot.exists() and not refresh_snapshot:
+            source = SnapshotSource.read(snapshot)
+            print(f"Read snapshot {snapshot} (created {source.snapshot.created})")
+            if source.snapshot.last_modified is not None:
+                modified = datetime.fromtimestamp(source.snapshot.last_modified).isoformat(timespec="seconds")
+                print(f"The newest entry in the snapshot was modified {modified}")
+            if jsonl is not None and jsonl.stat().st_mtime > snapshot.stat().st_mtime:
+                print(f"Warning: {jsonl} is newer than the snapshot, use --refresh-snapshot to read it again")
+        else:
+            if jsonl is not None:
+                source = JsonlSource(jsonl, resource_config_file, inflection_rules_file)
+                if inflection_rules_file is None:
+                    print("No inflection rules given, inflected forms will be missing from the tests")
+            else:
+                source = KarpSource(entry_queries, resource_queries)
+
+            if snapshot is not None:
+                source = SnapshotSource.create(snapshot, source, progress=tqdm)
+
+        resource_config = source.resource_config()
+        entries = list(tqdm(islice(source.entries(), first_entry, last_entry), desc="Reading entries"))
 
-    entries = [e for e in entries if "ordklass" in e.entry]
+        entries = [e for e in entries if "ordklass" in e.entry]
 
-    if words is not None:
-        entries = [e for e in entries if e.entry["ortografi"] in words]
+        if words is not None:
+            entries = [e for e in entries if e.entry["ortografi"] in words]
 
-    inflection = Inflection(entry_queries, entries)
-    ids = {}
+    with statistics.measure("inflection"):
+        inflection = Inflection(tqdm(source.inflection_rules(), desc="Reading inflection rules"), entries)
+
+    if isinstance(source, SnapshotSource):
+        # Save the id index next to the snapshot, for the next run to reuse
+        indexes = Indexes(
+            entries, id_index_file=snapshot.with_name(snapshot.name + ".ids"), fingerprint=source.snapshot.fingerprint
+        )
+    else:
+        indexes = Indexes(entries)
+
+    # The entries checked by this shard. Indexes and inflection tables
+    # are still built from all entries.
+    shard_entries = entries if shard is None else [e for e in entries if shard.contains(e)]
 
     new_variantformer = open("new_variantformer.jsonl", "w")
+    walk = EntryWalk(shard_entries)
 
     tests = [
         partial(test_saol_missing, entries, inflection=inflection),
         partial(test_böjningar, entries, inflection=inflection),
-        partial(test_references, entries, inflection=inflection, ids=ids),
+        partial(test_references, entries, inflection=inflection, indexes=indexes),
         partial(test_field_info, resource_config, entries),
         partial(test_ordled_agreement, entries),
         partial(test_ordled_format, entries),
         partial(test_funny_characters, entries),
-        partial(test_mismatched_brackets_etc, entries),
+        partial(test_mismatched_brackets_etc, entries, walk=walk),
         partial(test_examples, entries, inflection=inflection),
         partial(test_inflection_class_vs_inflection, inflection, entries),
         partial(test_particle_verbs, entries),
-        partial(test_moderverb, entries, ids=ids),
-        partial(test_blanksteg, entries),
+        partial(test_moderverb, entries, indexes=indexes),
+        partial(test_blanksteg, entries, walk=walk),
         partial(test_sorteringsform, entries),
         partial(test_uttal, entries),
         partial(test_uttal_grammar, entries),
@@ -100,30 +175,137 @@ def main(
         partial(test_böjningar_first, inflection, entries),
         partial(test_unabbreviated_inflections, entries),
         partial(test_word_segmentation, entries),
-        partial(test_variantformer, entries, ids),
-        partial(test_missing_variantformer, entries, ids, replacements_file=new_variantformer),
-        partial(test_so_too_many_references, entries),
-        partial(test_so_definitions, entries, inflection, ids),
-        partial(test_so_endings, entries),
+        partial(test_variantformer, entries, indexes),
+        partial(test_missing_variantformer, entries, replacements_file=new_variantformer),
+        partial(test_so_too_many_references, entries, walk=walk),
+        partial(test_so_definitions, entries, inflection, indexes),
+        partial(test_so_endings, entries, indexes),
     ]
 
+    if resource_config is None:
+        print("No resource config given, skipping test_field_info")
+        tests = [t for t in tests if func_name(t) != "test_field_info"]
+
     if test:
         tests = [t for t in tests if test in func_name(t)]
 
-    warnings = []
+    test_names = [func_name(t) for t in tests]
+    if shard is not None:
+        tests, map_steps = shard.plan(tests, shard_entries)
+        print(f"Shard {shard}: checking {len(shard_entries)} of {len(entries)} entries")
+
+    if cache is not None:
+        with statistics.measure("load_cache"):
+            test_cache = TestCache.load(cache, shard_entries)
+        print(f"{len(test_cache.changed)} of {len(shard_entries)} entries changed since the cached run")
+        tests = [test_cache.restrict(t) for t in tests]
+
+    # Tests that look at every field share one walk over the entries
+    # (or, for tests restricted by the cache, over the changed entries)
     for t in tests:
-        warnings += t()
-    test_reports = make_test_reports(warnings)
+        t.keywords.get("walk", walk).add_for_test(t)
 
-    if old_report:
-        old_test_reports = read_test_reports_excel(old_report)
-        if diff:
-            remove_old_warnings(test_reports, {"Testrapporter": old_test_reports})
+    # The warnings are kept on disk until the reports are made
+    with WarningSpool(output_directory) as spool:
+        if jobs > 1:
+            # test_missing_variantformer writes to new_variantformer.jsonl, so
+            # it must run in this process.
+            serial = [t for t in tests if func_name(t) == "test_missing_variantformer"]
+            # Compute the visible parts of entries up front, so that the workers
+            # share them instead of each computing their own. The same goes for the
+            # shared walk over all fields and the indexes the tests use.
+            with statistics.measure("precompute_shared"):
+                indexes.prepare(tests)
+                for entry in tqdm(entries, desc="Computing visible parts of entries"):
+                    visible_entry(entry)
+                    for namespace in [SO, SAOL]:
+                        if namespace.path in entry.entry:
+                            entry_hidden_prefixes(entry, namespace)
+                walk.run()
+                if cache is not None:
+                    test_cache.walk.run()
+            results = run_tests_parallel(tests, jobs, serial=serial)
         else:
-            replace_comments(test_reports, {"Testrapporter": old_test_reports})
+            # Warnings go straight to the spool, except for tests restricted by
+            # the cache, whose warnings must be completed with the cached ones
+            results = (
+                run_test(t, sink=None if cache is not None and is_per_entry(t) else partial(spool.add, i))
+                for i, t in enumerate(tests)
+            )
+
+        for i, (t, (test_warnings, stats)) in enumerate(zip(tests, results)):
+            if test_warnings is not None:
+                if cache is not None:
+                    test_warnings = test_cache.complete(t, test_warnings)
+                spool.add_all(i, test_warnings)
+            statistics.add(stats)
+
+        if cache is not None:
+            with statistics.measure("save_cache"):
+                test_cache.save()
+
+        if shard is not None:
+            result = ShardResult(shard, test_names)
+            for i, t in enumerate(tests):
+                result.warnings[func_name(t)] = spool.test_warnings(i)
+            for name, map_step in map_steps:
+                with statistics.measure(name):
+                    result.partial_results[name] = map_step()
+            result.stages = statistics.stages
+            path = result.write(output_directory)
+            print(f"Wrote {path}; combine the shards with the merge command")
+            return
+
+        write_reports(output_directory, spool, statistics, old_report, diff)
+
+
+@app.command()
+def merge(
+    shard_files: Annotated[list[Path], typer.Argument(help="shard files written by run --shard", show_default=False)],
+    output_directory: Annotated[
+        Path, typer.Option("--output-directory", "-o", help="output directory", show_default=False)
+    ],
+    old_report: Annotated[Optional[str], typer.Option(help="old test report for comments", show_default="all")] = None,
+    diff: Annotated[bool, typer.Option(help="only show warnings not in old report", show_default="all")] = False,
+):
+    """Combine the shard files from run --shard into the test reports."""
+
+    output_directory.mkdir(exist_ok=True)
+
+    statistics = RunStatistics()
+    with WarningSpool(output_directory) as spool:
+        with statistics.measure("merge_shards"):
+            warnings, shard_stages = merge_shards([ShardResult.read(path) for path in shard_files])
+            spool.add_all(0, warnings)
+        statistics.stages[:0] = shard_stages
+
+        write_reports(output_directory, spool, statistics, old_report, diff)
+
+
+def write_reports(output_directory, spool, statistics, old_report, diff):
+    with statistics.measure("make_reports"):
+        test_reports = spool.make_test_reports()
+
+        if old_report:
+            old_test_reports = read_test_reports_excel(old_report)
+            if diff:
+                remove_old_warnings(test_reports, {"Testrapporter": old_test_reports})
+            else:
+                replace_comments(test_reports, {"Testrapporter": old_test_reports})
+
+    # Writing the reports is only included in the JSON file, since it
+    # happens after the sheet has been made.
+    test_reports.setdefault("Testrapporter", {})["Körningsstatistik"] = make_test_report(statistics.warnings())
+
+    with statistics.measure("write_reports"):
+        write_test_reports_excel(output_directory, test_reports)
+        write_test_reports_html(output_directory, test_reports)
+
+    statistics.write_json(output_directory / "Körningsstatistik.json")
 
-    write_test_reports_excel(output_directory, test_reports)
-    write_test_reports_html(output_directory, test_reports)
 
+# Without a command, run the tests, as before there were several commands
+if len(sys.argv) < 2 or sys.argv[1] not in ["run", "merge", "--help", "--install-completion", "--show-completion"]:
+    sys.argv.insert(1, "run")
 
-typer.run(main)
+app()
@@ -0,0 +1,29 @@
+import sys
+from utils.markup_parser import lark_differences
+from utils.sources import read_jsonl
+
+# Checks that parse and parse_with_lark agree on every string in a JSONL export
+
+
+def strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from strings(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from strings(v)
+
+
+texts = {text for entry in read_jsonl(sys.argv[1]) for text in strings(entry)}
+
+differences = 0
+for text, result, lark_result in lark_differences(sorted(texts)):
+    differences += 1
+    print(repr(text))
+    print("  parse:          ", result)
+    print("  parse_with_lark:", lark_result)
+
+print(f"{differences} of {len(texts)} strings parsed differently")
+sys.exit(1 if differences else 0)
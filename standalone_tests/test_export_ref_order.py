@@ -1,7 +1,8 @@
-import json
+import sys
 import re
 from dataclasses import dataclass
 from collections import defaultdict
+from utils.sources import read_jsonl
 
 
 @dataclass
@@ -72,8 +73,9 @@ interest_groups = {"till A till B", "till iA , jA", "till A , B", "till A el. B"
 groups = defaultdict(list)
 wrong_order = []
 
-for line in open("/home/nick/prog/sb/export-stuff/salex_digi_250825.jsonl", "r"):
-    entry = json.loads(line)
+export_path = sys.argv[1] if len(sys.argv) > 1 else "/home/nick/prog/sb/export-stuff/salex_digi_250825.jsonl"
+
+for entry in read_jsonl(export_path):
     saol = entry.get("saol")
     if not saol:
         continue
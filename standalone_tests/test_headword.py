@@ -1,5 +1,6 @@
-import json
+import sys
 from collections import defaultdict
+from utils.sources import read_jsonl
 from frozendict import deepfreeze
 
 
@@ -35,9 +36,10 @@ def abstract(entry):
 
 groups = defaultdict(list)
 
-for line in open("/home/nick/prog/sb/export-stuff/saol_tryckt_250825.jsonl", "r"):
-    #    entry = visible_part(json.loads(line), test=entry_is_visible_in_printed_book)
-    entry = json.loads(line)
+export_path = sys.argv[1] if len(sys.argv) > 1 else "/home/nick/prog/sb/export-stuff/saol_tryckt_250825.jsonl"
+
+for entry in read_jsonl(export_path):
+    #    entry = visible_part(entry, test=entry_is_visible_in_printed_book)
     if entry["ingångstyp"] == "variant":
         continue
 
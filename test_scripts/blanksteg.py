@@ -1,8 +1,8 @@
-from utils.salex import SAOL, SO, FieldWarning, is_visible
+from utils.salex import FieldWarning
+from utils.visitor import EntryWalk, leaf_check, walks
 from dataclasses import dataclass
-from tqdm import tqdm
-from karp.foundation import json
 from utils.markup_parser import strip_markup
+from utils.incremental import per_entry
 
 
 @dataclass(frozen=True)
@@ -17,25 +17,19 @@ class Blanksteg(FieldWarning):
         return super().to_dict()
 
 
-def test_blanksteg(entries):
-    for entry in tqdm(entries, desc="Checking spaces"):
-        for path in json.all_paths(entry.entry):
-            if not is_visible(path, entry.entry):
-                continue
-            value = json.get_path(path, entry.entry)
-            if not isinstance(value, str):
-                continue
-
-            if path[0] == "so":
-                namespace = SO
-                path = path[1:]
-            elif path[0] == "saol":
-                namespace = SAOL
-                path = path[1:]
-            else:
-                namespace = None
-
-            value = strip_markup(value)
-
-            if value.strip().replace("  ", " ") != value.removesuffix("\n"):
-                yield Blanksteg(entry, namespace, path, None)
+@leaf_check()
+def check_blanksteg(leaf):
+    if not leaf.visible_in_entry:
+        return
+
+    value = strip_markup(leaf.value)
+
+    if value.strip().replace("  ", " ") != value.removesuffix("\n"):
+        yield Blanksteg(leaf.entry, leaf.namespace, leaf.path, None)
+
+
+@per_entry
+@walks(check_blanksteg)
+def test_blanksteg(entries, walk=None):
+    walk = walk or EntryWalk(entries)
+    yield from walk.warnings(check_blanksteg)
@@ -1,7 +1,8 @@
-from utils.salex import SAOL, EntryWarning, visible_part
+from utils.salex import SAOL, EntryWarning, visible_entry
 from dataclasses import dataclass
 from karp.foundation import json
 from tqdm import tqdm
+from utils.incremental import per_entry
 
 
 @dataclass(frozen=True)
@@ -18,9 +19,10 @@ class EmptyEntryWarning(EntryWarning):
         return result
 
 
+@per_entry
 def test_empty_entries(entries):
     for entry in tqdm(entries, desc="Finding empty entries"):
-        body = visible_part(entry.entry)
+        body = visible_entry(entry)
 
         for path in json.expand_path("saol.huvudbetydelser", body):
             huvudbetydelse = json.get_path(path, body)
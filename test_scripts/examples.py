@@ -7,6 +7,7 @@ from utils.testing import highlight
 from utils.markup_parser import strip_markup
 from tqdm import tqdm
 from dataclasses import dataclass
+from utils.sharding import per_shard
 
 
 @dataclass(frozen=True)
@@ -145,6 +146,7 @@ def check_text(entry, namespace, field, ortografi, böjningar, text, kind):
         )
 
 
+@per_shard
 def test_examples(entries, inflection):
     for entry in tqdm(entries, desc="Checking example sentences"):
         for field, (namespace, kind) in fields.items():
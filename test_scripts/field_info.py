@@ -1,7 +1,8 @@
 from collections import Counter
 from dataclasses import dataclass
 from utils.testing import TestWarning
-from utils.salex import visible_part
+from utils.salex import visible_entry
+from utils.sharding import map_reduce
 
 
 @dataclass
@@ -23,17 +24,35 @@ class Statistics:
         return self.present / self.total
 
 
-def resource_statistics(resource_config, entries):
+@dataclass
+class FieldCounts:
+    present_counts: Counter
+    total_counts: Counter
+    resource_config_fields: set[str]
+
+
+def count_fields(resource_config, entries):
     present_counts = Counter()
     total_counts = Counter()
 
     for entry in entries:
-        count_frequency(
-            [], resource_config.entry_field_config(), visible_part(entry.entry), present_counts, total_counts
-        )
+        count_frequency([], resource_config.entry_field_config(), visible_entry(entry), present_counts, total_counts)
+
+    return FieldCounts(present_counts, total_counts, set(resource_config.nested_fields()))
+
+
+def merge_field_counts(parts):
+    result = FieldCounts(Counter(), Counter(), set())
+    for counts in parts:
+        result.present_counts.update(counts.present_counts)
+        result.total_counts.update(counts.total_counts)
+        result.resource_config_fields |= counts.resource_config_fields
+    return result
 
-    for field, total_count in total_counts.items():
-        present_count = present_counts[field]
+
+def resource_statistics(counts):
+    for field, total_count in counts.total_counts.items():
+        present_count = counts.present_counts[field]
 
         if field != "":
             yield Statistics(field, present_count, total_count)
@@ -90,8 +109,9 @@ class FieldStatistics(TestWarning):
         return {"Fält": self.statistics.field, "Frekvens": frequency}
 
 
-def test_field_info(resource_config, entries):
-    statistics = list(resource_statistics(resource_config, entries))
+def field_info_warnings(parts):
+    counts = merge_field_counts(parts)
+    statistics = list(resource_statistics(counts))
     always_present = [s for s in statistics if s.missing_freq == 0]
     usually_present = [s for s in statistics if 0 < s.missing_freq <= 0.05]
     usually_absent = [s for s in statistics if s.present_freq <= 0.05]
@@ -105,7 +125,11 @@ def test_field_info(resource_config, entries):
     for s in usually_absent:
         yield FieldStatistics("Usually absent", s)
 
-    resource_config_fields = set(resource_config.nested_fields())
     for s in statistics:
-        if s.field not in resource_config_fields:
+        if s.field not in counts.resource_config_fields:
             yield FieldStatistics("Extra fields", s)
+
+
+@map_reduce(count_fields, field_info_warnings)
+def test_field_info(resource_config, entries):
+    yield from field_info_warnings([count_fields(resource_config, entries)])
@@ -1,9 +1,8 @@
-from karp.foundation import json
 from utils import markup_parser
-from utils.salex import FieldWarning, SAOL, SO, is_visible
+from utils.salex import FieldWarning, SAOL, SO
+from utils.visitor import EntryWalk, leaf_check, walks
 from dataclasses import dataclass
-from tqdm import tqdm
-import lark
+from utils.incremental import per_entry
 
 
 @dataclass(frozen=True)
@@ -64,32 +63,42 @@ def quotes_ok(text):
     return (matches % 2) == 0
 
 
-def test_mismatched_brackets_etc(entries):
-    for entry in tqdm(entries, desc="Checking bracket nesting"):
-        for namespace in [SO, SAOL]:
-            body = entry.entry.get(namespace.path, {})
-            for path in json.all_paths(body):
-                value = json.get_path(path, body)
-                if not isinstance(value, str):
-                    continue
-                if not is_visible(path, body):
-                    continue
-
-                if path[-1] == "ordbildning":
-                    text = value
-                else:
-                    try:
-                        tree = markup_parser.parse(value)
-                    except lark.LarkError:
-                        yield MismatchedBrackets(entry, namespace, path, None, "ogiltig markup")
-                        continue
-
-                    text = markup_parser.text_contents(tree)
-
-                if not brackets_ok(text):
-                    yield MismatchedBrackets(
-                        entry, namespace, path, None, "obalanserade parenteser eller citeringstecken"
-                    )
-
-                if not quotes_ok(text):
-                    yield MismatchedBrackets(entry, namespace, path, None, "kolla citeringstecken")
+def describe_markup_problem(problem):
+    match problem.kind:
+        case markup_parser.UNCLOSED_TAG:
+            return f"[{problem.text} utan ]"
+        case markup_parser.UNKNOWN_TAG:
+            return f"okänd tagg {problem.text.strip()}"
+        case markup_parser.STRAY_CLOSE:
+            return "] utan ["
+        case markup_parser.BAD_ESCAPE:
+            return "\\ sist på raden"
+
+
+@leaf_check(namespaces=[SO, SAOL])
+def check_mismatched_brackets(leaf):
+    entry, namespace, path, value = leaf.entry, leaf.namespace, leaf.path, leaf.value
+
+    if path and path[-1] == "ordbildning":
+        text = value
+    else:
+        tree, problems = markup_parser.parse_tolerant(value)
+        if problems:
+            details = ", ".join(describe_markup_problem(problem) for problem in problems)
+            yield MismatchedBrackets(entry, namespace, path, None, f"ogiltig markup: {details}")
+            return
+
+        text = markup_parser.text_contents(tree)
+
+    if not brackets_ok(text):
+        yield MismatchedBrackets(entry, namespace, path, None, "obalanserade parenteser eller citeringstecken")
+
+    if not quotes_ok(text):
+        yield MismatchedBrackets(entry, namespace, path, None, "kolla citeringstecken")
+
+
+@per_entry
+@walks(check_mismatched_brackets)
+def test_mismatched_brackets_etc(entries, walk=None):
+    walk = walk or EntryWalk(entries)
+    yield from walk.warnings(check_mismatched_brackets)
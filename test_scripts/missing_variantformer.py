@@ -1,4 +1,4 @@
-from utils.salex import EntryWarning, SAOL, visible_part, entry_is_visible_in_printed_book
+from utils.salex import EntryWarning, SAOL, visible_namespace, entry_is_visible_in_printed_book
 from dataclasses import dataclass
 from tqdm import tqdm
 import json
@@ -48,17 +48,17 @@ def make_variant_form(entry, variant):
     return result
 
 
-def test_missing_variantformer(entries, ids, replacements_file=None):
+def test_missing_variantformer(entries, replacements_file=None):
     variant_ids = set()
     variant_orto_h = set()
     for entry in tqdm(entries, desc="Checking variant forms"):
-        if saol_lemma := visible_part(entry.entry.get("saol"), test=entry_is_visible_in_printed_book):
+        if saol_lemma := visible_namespace(entry, SAOL, test=entry_is_visible_in_printed_book):
             if entry.entry.get("ingångstyp") == "variant":
                 variant_ids.add(saol_lemma["id"])
                 variant_orto_h.add((entry.entry["ortografi"], saol_lemma.get("homografNr")))
 
     for entry in tqdm(entries, desc="Checking variant forms"):
-        if saol_lemma := visible_part(entry.entry.get("saol"), test=entry_is_visible_in_printed_book):
+        if saol_lemma := visible_namespace(entry, SAOL, test=entry_is_visible_in_printed_book):
             for variant in saol_lemma.get("variantformer", []):
                 orto_hnr = (variant["ortografi"], variant.get("homografNr"))
                 if variant["id"] not in variant_ids and orto_hnr not in variant_orto_h:
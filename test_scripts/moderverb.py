@@ -2,6 +2,8 @@ from utils.salex import is_visible, EntryWarning, SAOL, Id, LNR, entry_cell
 from tqdm import tqdm
 from dataclasses import dataclass
 from karp.lex.domain.dtos import EntryDto
+from utils.indexes import uses_indexes
+from utils.sharding import per_shard
 
 
 @dataclass(frozen=True)
@@ -19,7 +21,10 @@ class InflectionClassMismatch(EntryWarning):
         }
 
 
-def test_moderverb(entries, ids):
+@per_shard
+@uses_indexes("ids")
+def test_moderverb(entries, indexes):
+    ids = indexes.ids
     for entry in tqdm(entries, desc="Checking moderverb"):
         if entry.entry.get("ingångstyp") not in ["partikelverb", "reflexivt_verb"]:
             continue
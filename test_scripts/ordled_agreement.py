@@ -1,6 +1,7 @@
 from utils.salex import SAOL, EntryWarning
 from dataclasses import dataclass
 from tqdm import tqdm
+from utils.incremental import per_entry
 
 
 @dataclass(frozen=True)
@@ -26,6 +27,7 @@ class UppdelasWarning(EntryWarning):
         return super().to_dict() | {"Ordled": self.ordled, "Uppdelas": "ja" if self.uppdelas else "nej"}
 
 
+@per_entry
 def test_ordled_agreement(entries):
     for entry in tqdm(entries, desc="Checking ordled agreement"):
         ortografi = entry.entry.get("ortografi")
@@ -72,6 +74,7 @@ def test_ordled_agreement(entries):
                 yield UppdelasWarning(entry, SAOL, ordled, uppdelas)
 
 
+@per_entry
 def test_ordled_format(entries):
     for entry in tqdm(entries, desc="Checking ordled format"):
         ordled = entry.entry.get("saol", {}).get("ordled")
@@ -1,6 +1,7 @@
 from utils.salex import EntryWarning, SAOL
 from tqdm import tqdm
 from dataclasses import dataclass
+from utils.incremental import per_entry
 
 
 @dataclass(frozen=True)
@@ -72,6 +73,7 @@ particles = {
 }
 
 
+@per_entry
 def test_particle_verbs(entries):
     for entry in tqdm(entries, desc="Checking particle verbs"):
         if entry.entry.get("ingångstyp") not in ["partikelverb", "reflexivt_verb"]:
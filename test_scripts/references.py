@@ -1,7 +1,6 @@
 from karp.foundation import json
 from collections import defaultdict
 from utils.salex import (
-    find_ids,
     find_refs,
     is_visible,
     SO,
@@ -19,28 +18,25 @@ from utils.salex import (
     find_refs_in_namespace,
     entry_sort_key,
     refid_ref_fields,
+    field_accessor,
+    refid_re,
+    scan_references,
 )
 from utils.testing import highlight
+from utils.indexes import uses_indexes
 from dataclasses import dataclass
 from tqdm import tqdm
-import re
 from karp.lex.domain.dtos import EntryDto
 
-refid_re = re.compile(r"\+([^ +]*)\(refid=([a-zA-Z0-9]*)\)(?!\(refid=)")
-id_re = re.compile(r"(?:x|l|kc)nr[a-zA-Z0-9]+")
-only_refid_re = re.compile(r"refid")
-plus_re = re.compile(r"\+(?![0-9])(?!verb)\w+")
-
-
-def match_contains(m1, m2):
-    return m1.start() <= m2.start() and m1.end() >= m2.end()
-
 
 @dataclass(frozen=True)
 class DuplicateId(TestWarning):
     entry: EntryDto
     entry2: EntryDto
     id: Id
+    # The number of entries that refer to the id, which can't tell which
+    # of the two entries they mean
+    referrers: int = 0
 
     def category(self):
         return f"Duplicat id ({self.id.namespace})"
@@ -50,8 +46,12 @@ class DuplicateId(TestWarning):
             "Ord": entry_cell(self.entry, self.id.namespace),
             "Ord 2": entry_cell(self.entry2, self.id.namespace),
             "Id": self.id,
+            "Hänvisas från": self.referrers,
         }
 
+    def extra_fields(self):
+        return {"Hänvisas från"}
+
 
 @dataclass(frozen=True)
 class HomografWrong(TestWarning):
@@ -133,45 +133,17 @@ class BadReferenceSyntax(TestWarning):
         return (self.location.field, entry_sort_key(self.location.entry, self.location.namespace))
 
 
-def test_references(entries, inflection, ids=None):
-    if ids is None:
-        ids = {}
-
-    all_ids = defaultdict(list)
+@uses_indexes("ids", "reference_graph")
+def test_references(entries, inflection, indexes):
+    ids = indexes.ids
+    all_ids = indexes.all_ids
     by_ortografi: dict[tuple[Namespace, str], list[Id]] = defaultdict(list)
     by_ortografi_extra: set[tuple[Namespace, str]] = set()
 
-    def better(id, source, target):
-        if source.visible and not target.visible:
-            return True
-        if (
-            id.namespace == SAOL
-            and source.entry.entry.get("ingångstyp") == "variant"
-            and target.entry.entry.get("ingångstyp") != "variant"
-        ):
-            return True
-        return False
-
-    # Read in all IDs and check for duplicates
-    for e in tqdm(entries, desc="Finding IDs"):
-        for id, source in find_ids(e):
-            if id.namespace == SAOL and e.entry.get("ingångstyp") == "variant":
-                continue
-            # if id.type == TEXT and id.id.homografNr == 3: breakpoint()
-            if id in ids:
-                if better(id, source, ids[id]):
-                    ids[id] = source
-                    all_ids[id].append(source)
-                elif better(id, ids[id], source):
-                    pass
-                elif not (id.type == TEXT and id.id.homografNr is None):  # missing homografNr are caught below
-                    yield DuplicateId(entry=ids[id].entry, entry2=e, id=id)
-                else:
-                    all_ids[id].append(source)
-
-            else:
-                ids[id] = source
-                all_ids[id].append(source)
+    # Check for duplicate IDs
+    for id, entry, entry2 in indexes.duplicate_ids:
+        referrers = len(indexes.reference_graph.referrers(id))
+        yield DuplicateId(entry=entry, entry2=entry2, id=id, referrers=referrers)
 
     return
     # Populate index by ortografi/homografNr
@@ -277,29 +249,20 @@ def test_references(entries, inflection, ids=None):
                 if not isinstance(value, str):
                     continue
 
-                references = list(refid_re.finditer(value))
+                scan = scan_references(value)
 
-                # Check for references with bad syntax
-                tests = [plus_re, only_refid_re]
-                if "hänvisning" not in path:
-                    tests.append(id_re)
-
-                loc = IdLocation(entry, namespace, path, value)
-                errors = []
-                for regexp in tests:
-                    for maybe_ref in regexp.finditer(value):
-                        if not any(match_contains(ref, maybe_ref) for ref in references):
-                            errors.append(BadReferenceSyntax(entry, loc, maybe_ref.group(0)))
-
-                # Only generate one error per string, since bad references tend
-                # to trigger more than one of the regexp tests
-                yield from errors[:1]
+                # Check for references with bad syntax. Only generate one
+                # error per string, since bad references tend to trigger
+                # more than one of the regexp tests
+                error = scan.first_malformed(include_ids="hänvisning" not in path)
+                if error is not None:
+                    yield BadReferenceSyntax(entry, IdLocation(entry, namespace, path, value), error)
 
                 # Check that target of reference is correct
-                for ref in references:
-                    loc = IdLocation(entry, namespace, path, ref.group(0))
-                    word = ref.group(1).replace("_", " ").replace("(", "").replace(")", "")
-                    target = ref.group(2)
+                for ref in scan.references:
+                    loc = IdLocation(entry, namespace, path, ref.text)
+                    word = ref.word.replace("_", " ").replace("(", "").replace(")", "")
+                    target = ref.target
                     kind, ref = parse_refid(None, target)
                     id = Id(namespace, kind, ref)
                     if id not in ids:
@@ -337,9 +300,7 @@ def test_references(entries, inflection, ids=None):
 
             # Check fields that use +refid-syntax for references
             for field in refid_ref_fields[namespace]:
-                for path in json.expand_path(field, body):
-                    value = json.get_path(path, body)
-
+                for path, value in field_accessor(field)(body):
                     if not isinstance(value, str) or not refid_re.fullmatch(value):
                         loc = IdLocation(entry, namespace, path, value)
                         yield BadReferenceSyntax(entry, loc, value)
@@ -2,7 +2,6 @@ from tqdm import tqdm
 from collections import defaultdict
 from utils.salex import is_visible, EntryWarning, SO, SAOL, parse_böjning, variant_forms
 from dataclasses import dataclass
-from copy import deepcopy
 
 
 @dataclass(frozen=True)
@@ -23,7 +22,6 @@ def test_saol_missing(entries, inflection):
     extras = set()
 
     for entry in tqdm(entries, desc="Finding SO entries not in SAOL"):
-        entry = deepcopy(entry)
         for namespace, other_namespace in [(SAOL, SO), (SO, SAOL)]:
             if namespace.path in entry.entry and (is_visible(namespace.path, entry.entry) if namespace == SO else True):
                 lemmas[namespace][entry.entry["ortografi"]].append(entry)
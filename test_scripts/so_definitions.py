@@ -3,7 +3,7 @@ from collections import Counter, defaultdict
 from nltk.tokenize import RegexpTokenizer
 from tqdm import tqdm
 from utils.salex import (
-    visible_part,
+    visible_entry,
     full_ref_regexp,
     variant_forms,
     SO,
@@ -15,9 +15,9 @@ from utils.salex import (
 )
 from karp.lex.domain.dtos import EntryDto
 from enum import Enum, global_enum
-from copy import deepcopy
 from dataclasses import dataclass
 from functools import total_ordering
+from utils.indexes import uses_indexes
 
 
 @dataclass(frozen=True)
@@ -119,16 +119,16 @@ def summarise(n=1, prefix=(), limit=100, indent=0):
 # summarise(limit=20)
 
 
-def test_so_definitions(entries, inflection, ids):
+@uses_indexes("ids")
+def test_so_definitions(entries, inflection, indexes):
+    ids = indexes.ids
     forms = defaultdict(lambda: defaultdict(list))
     for entry in tqdm(entries, desc="Collecting inflected forms"):
         if "so" in entry.entry and entry.entry["so"].get("visas", True):
             forms[entry.entry["ortografi"]][LEMMA].append(entry)
         variants_plus_vnomen = list(variant_forms(entry, SO))
         if "so" in entry.entry and "vnomen" in entry.entry["so"]:
-            entry_no_vnomen = deepcopy(entry)
-            del entry_no_vnomen.entry["so"]["vnomen"]
-            variants = list(variant_forms(entry_no_vnomen, SO))
+            variants = list(variant_forms(entry, SO, exclude_fields=("vnomen",)))
             vnomen = list(set(variants_plus_vnomen) - set(variants))
         else:
             variants = variants_plus_vnomen
@@ -148,7 +148,7 @@ def test_so_definitions(entries, inflection, ids):
     definitions = defaultdict(list)
     definition_targets = defaultdict(list)
     for entry in tqdm(entries, desc="Checking SO definitions"):
-        body = visible_part(entry.entry)
+        body = visible_entry(entry)
         for field in fields:
             for path in json.expand_path(field, body):
                 definition = tokenize(json.get_path(path, body))
@@ -206,7 +206,7 @@ def test_so_definitions(entries, inflection, ids):
 
                         if len(suggestions) == 1:
                             suggestion = suggestions[0]
-                            hb = visible_part(suggestion.entry)["so"]["huvudbetydelser"]
+                            hb = visible_entry(suggestion)["so"]["huvudbetydelser"]
                             if len(hb) == 1:
                                 yield DefinitionLinkSuggestion(word, SO, d, orig, suggestions)
                         # print("  ", format(definitions[d1][0]) + ":", orig)
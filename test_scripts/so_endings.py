@@ -1,4 +1,4 @@
-from utils.salex import visible_part, full_ref_regexp, EntryWarning, SO, entry_cell
+from utils.salex import visible_entry, full_ref_regexp, EntryWarning, SO, entry_cell
 from tqdm import tqdm
 from karp.foundation import json
 from karp.lex.domain.dtos import EntryDto
@@ -7,6 +7,7 @@ from collections import Counter, defaultdict
 from test_scripts.references import refid_re
 
 from dataclasses import dataclass
+from utils.indexes import uses_indexes
 
 
 @dataclass(frozen=True)
@@ -61,11 +62,9 @@ def strip_prefix(w1, w2):
     return w1, w2
 
 
-def test_so_endings(entries):
-    words = defaultdict(list)
-    for entry in tqdm(entries, desc="Collecting words"):
-        if "so" in entry.entry and entry.entry["so"].get("visas", True):
-            words[entry.entry["ortografi"]].append(entry)
+@uses_indexes("visible_by_ortografi")
+def test_so_endings(entries, indexes):
+    words = indexes.visible_by_ortografi[SO]
 
     rules = Counter()
     not_rules = Counter()
@@ -73,7 +72,7 @@ def test_so_endings(entries):
     totals = Counter()
 
     for i, entry in tqdm(enumerate(entries), desc="Finding similar words"):
-        body = visible_part(entry.entry)
+        body = visible_entry(entry)
         word = body["ortografi"]
         for definition_field in definition_fields:
             for definition_path in json.expand_path(definition_field, body):
@@ -98,8 +97,8 @@ def test_so_endings(entries):
         if count <= 1 or not_count == 0:
             continue
         for entry, word, definition in not_rules_entries[a, b]:
-            if len(words[word]) >= 1:
+            if len(words.get(word, [])) >= 1:
                 suggestion = words[word][0]
-                hb = visible_part(suggestion.entry)["so"]["huvudbetydelser"]
+                hb = visible_entry(suggestion)["so"]["huvudbetydelser"]
                 if len(hb) == 1 or True:
                     yield EndingLinkSuggestion(entry, SO, (a, b), not_count, definition, suggestion)
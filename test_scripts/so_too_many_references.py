@@ -1,8 +1,8 @@
-from tqdm import tqdm
-from utils.salex import visible_part, EntryWarning, SO, ref_regexp
+from utils.salex import EntryWarning, SO, scan_references
 from utils.testing import markup_cell
+from utils.visitor import EntryWalk, leaf_check, walks
 from dataclasses import dataclass
-from karp.foundation import json
+from utils.incremental import per_entry
 
 
 @dataclass(frozen=True)
@@ -23,18 +23,22 @@ class SOTooManyReferences(EntryWarning):
 too_many = 2
 
 
-def test_so_too_many_references(entries):
-    for entry in tqdm(entries, desc="Finding SO entries with too many references"):
-        body = visible_part(entry.entry.get("so", {}))
+@leaf_check(namespaces=[SO], visible_only=False)
+def check_so_too_many_references(leaf):
+    # Like visible_part of the SO body, which doesn't look at whether the
+    # SO body itself is visible
+    if leaf.hidden_depth > 1:
+        return
+    if leaf.field.endswith("etymologi"):
+        return
 
-        for path in json.all_paths(body):
-            field = json.path_str(path, strip_positions=True)
-            if field.endswith("etymologi"):
-                continue
-            value = json.get_path(path, body)
-            if not isinstance(value, str):
-                continue
+    reference_count = len(scan_references(leaf.value).refids)
+    if reference_count >= too_many:
+        yield SOTooManyReferences(leaf.entry, SO, leaf.field, leaf.value)
 
-            reference_count = len(list(ref_regexp.findall(value)))
-            if reference_count >= too_many:
-                yield SOTooManyReferences(entry, SO, field, value)
+
+@per_entry
+@walks(check_so_too_many_references)
+def test_so_too_many_references(entries, walk=None):
+    walk = walk or EntryWalk(entries)
+    yield from walk.warnings(check_so_too_many_references)
@@ -1,6 +1,7 @@
 from utils.salex import EntryWarning, SAOL
 from tqdm import tqdm
 from dataclasses import dataclass
+from utils.incremental import per_entry
 
 
 @dataclass(frozen=True)
@@ -45,6 +46,7 @@ def replace(x):
     return x
 
 
+@per_entry
 def test_sorteringsform(entries):
     for entry in tqdm(entries, desc="Checking sorteringsformer"):
         sorteringsform = entry.entry.get("sorteringsform")
@@ -2,6 +2,7 @@ from utils.salex import EntryWarning, SAOL, SO, parse_böjning, is_visible, vari
 from utils.testing import markup_cell
 from tqdm import tqdm
 from dataclasses import dataclass
+from utils.sharding import per_shard
 
 
 @dataclass(frozen=True)
@@ -131,6 +132,7 @@ def suspicious(word, case):
     return result
 
 
+@per_shard
 def test_böjningar(entries, inflection):
     for entry in tqdm(entries, desc="Checking inflected forms"):
         word = entry.entry.get("ortografi")
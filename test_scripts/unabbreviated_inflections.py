@@ -2,6 +2,7 @@ from tqdm import tqdm
 from utils.salex import EntryWarning, SAOL, parse_böjning
 from utils.testing import markup_cell
 from dataclasses import dataclass
+from utils.incremental import per_entry
 
 
 @dataclass(frozen=True)
@@ -37,6 +38,7 @@ def abbreviations_ok(entry, namespace):
                     yield "Tilde saknas"
 
 
+@per_entry
 def test_unabbreviated_inflections(entries):
     for entry in tqdm(entries, desc="Checking inflection abbreviations"):
         for namespace in [SAOL]:
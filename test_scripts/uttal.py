@@ -6,6 +6,7 @@ from nltk.corpus import wordnet
 from tqdm import tqdm
 import re
 from pathlib import Path
+from utils.incremental import per_entry
 
 data_dir = Path(__file__).parent.parent / "data"
 
@@ -334,9 +335,11 @@ def check_all_uttal(entry, namespace, ortografi_field, uttal_field, variant):
                     yield UttalWarning(entry, namespace, ortografi if variant else None, uttal)
 
 
+@per_entry
 def test_uttal(entries):
     for entry in tqdm(entries, desc="Checking pronunciation"):
-        # hack
+        # hack (cached visible views made by visible_entry don't get these
+        # extra fields, but anything reading them can use the top-level one)
         ortografi = entry.entry.get("ortografi")
         entry.entry.get("so", {})["ortografi"] = ortografi
         entry.entry.get("saol", {})["ortografi"] = ortografi
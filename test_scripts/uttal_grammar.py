@@ -1,10 +1,11 @@
-from utils.salex import SAOL, EntryWarning, visible_part
+from utils.salex import SAOL, EntryWarning, visible_entry
 from utils.testing import markup_cell
 from dataclasses import dataclass
 from karp.foundation import json
 import re
 from enum import global_enum, Enum
 from parsy import test_item, match_item, seq, ParseError
+from utils.incremental import per_entry
 
 
 @dataclass(frozen=True)
@@ -71,9 +72,10 @@ def combine_uttal(uttals):
     return " ".join(result)
 
 
+@per_entry
 def test_uttal_grammar(entries):
     for entry in entries:
-        body = visible_part(entry.entry)
+        body = visible_entry(entry)
         ortografi = entry.entry["ortografi"]
         uttal = [json.get_path(p, body) for p in json.expand_path("saol.uttal", body)]
         if not uttal:
@@ -1,7 +1,9 @@
-from utils.salex import EntryWarning, SAOL, IdLocation, parse_ref, visible_part
+from utils.salex import EntryWarning, SAOL, IdLocation, parse_ref, visible_namespace
 from dataclasses import dataclass
 from tqdm import tqdm
 from karp.foundation import json
+from utils.indexes import uses_indexes
+from utils.sharding import per_shard
 
 # TODO test variant forms
 # TODO check that no homografNr
@@ -24,9 +26,12 @@ class VariantWarning(EntryWarning):
         }
 
 
-def test_variantformer(entries, ids):
+@per_shard
+@uses_indexes("ids")
+def test_variantformer(entries, indexes):
+    ids = indexes.ids
     for entry in tqdm(entries, desc="Checking variant forms"):
-        if saol_lemma := visible_part(entry.entry.get("saol")):
+        if saol_lemma := visible_namespace(entry, SAOL):
             if not saol_lemma["visas"]:
                 continue
             if entry.entry.get("ingångstyp") == "variant":
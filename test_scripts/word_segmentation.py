@@ -1,6 +1,6 @@
 from tqdm import tqdm
 from collections import Counter, defaultdict
-from utils.salex import EntryWarning, SAOL, entry_sort_key, entry_cell, visible_part
+from utils.salex import EntryWarning, SAOL, entry_sort_key, entry_cell, visible_entry
 from dataclasses import dataclass
 import re
 from bisect import bisect_left
@@ -144,7 +144,7 @@ def test_word_segmentation(entries):
     saol_entries = []
 
     for entry in tqdm(entries, desc="Reading SAOL entries"):
-        body = visible_part(entry.entry)
+        body = visible_entry(entry)
         if "saol" not in body:
             continue
         saol_entries.append(entry)
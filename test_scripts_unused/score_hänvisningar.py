@@ -84,8 +84,7 @@ def visas(path, entry):
 
 
 entries = list(entry_queries.all_entries("salex", expand_plugins=False))
-# with open("entries.pickle", "rb") as file:
-#    entries = pickle.load(file)
+# entries = read_snapshot("salex.snapshot").entries  # from utils.snapshot
 
 
 # add keys
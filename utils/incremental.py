@@ -0,0 +1,214 @@
+"""
+Incremental test runs: remembering the warnings of each entry between
+runs, so that only entries that changed since the last run are checked.
+
+This only works for tests whose warnings about an entry depend on nothing
+but that entry. Such tests are marked with @per_entry; all other tests
+(e.g. ones that compare entries with each other or count things over all
+entries) are always run in full.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import cache, partial
+from pathlib import Path
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+from utils.testing import ReportedWarning, warning_entry_id
+from utils.timing import func_name
+from utils.visitor import EntryWalk
+
+CACHE_VERSION = 1
+
+root_dir = Path(__file__).parent.parent
+
+
+def per_entry(test):
+    """
+    Decorator marking a test as checking each entry on its own. The test
+    must take the entries as an argument called `entries`, and each warning
+    it produces must have an `entry` attribute.
+    """
+
+    test.per_entry = True
+    return test
+
+
+def is_per_entry(test):
+    while isinstance(test, partial):
+        test = test.func
+    return getattr(test, "per_entry", False)
+
+
+def entry_hash(entry) -> bytes:
+    data = json.dumps(entry.entry, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(data.encode(), digest_size=16).digest()
+
+
+def code_fingerprint(test) -> str:
+    """
+    A fingerprint of the code and data a test depends on: its own module,
+    the project modules it imports, everything in utils/ and data/.
+    Cached warnings are thrown away when it changes.
+    """
+
+    while isinstance(test, partial):
+        test = test.func
+
+    return _fingerprint_files((*_module_files(test.__module__), *_shared_files()))
+
+
+@cache
+def _module_files(module_name):
+    """The file of a module and of the project modules it imports things from."""
+
+    module = sys.modules[module_name]
+    files = {Path(module.__file__)}
+    for value in vars(module).values():
+        imported = inspect.getmodule(value)
+        path = getattr(imported, "__file__", None)
+        if path is not None and Path(path).is_relative_to(root_dir):
+            files.add(Path(path))
+    return tuple(sorted(files))
+
+
+@cache
+def _shared_files():
+    utils_files = sorted((root_dir / "utils").glob("*.py"))
+    data_files = sorted(p for p in (root_dir / "data").rglob("*") if p.is_file())
+    return (*utils_files, *data_files)
+
+
+@cache
+def _fingerprint_files(files):
+    digest = hashlib.blake2b(digest_size=16)
+    for path in files:
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+@dataclass
+class TestCache:
+    """
+    The warnings of all per-entry tests from the last run, by test and
+    entry id, plus a hash of each entry's contents.
+    """
+
+    path: Path
+    entries: list
+    hashes: dict = field(default_factory=dict)
+    # test name -> (code fingerprint, entry id -> warnings)
+    tests: dict = field(default_factory=dict)
+    changed: list = field(default_factory=list)
+    walk: EntryWalk | None = None
+    # Names of the tests whose warnings have been updated in this run.
+    # Only these are saved, since the others haven't seen the new entries.
+    completed: set = field(default_factory=set)
+
+    @classmethod
+    def load(cls, path, entries):
+        """Load the cache and find out which entries changed since it was saved."""
+
+        path = Path(path)
+        old_hashes, old_tests = {}, {}
+        if path.exists():
+            with open(path, "rb") as file:
+                data = pickle.load(file)
+            if data.get("version") == CACHE_VERSION:
+                old_hashes, old_tests = data["hashes"], data["tests"]
+
+        hashes = {entry.id: entry_hash(entry) for entry in entries}
+        changed = [entry for entry in entries if old_hashes.get(entry.id) != hashes[entry.id]]
+        return cls(path, entries, hashes, old_tests, changed, EntryWalk(changed))
+
+    def restrict(self, test):
+        """
+        If the test is per-entry and has cached warnings, make it only check
+        the entries that changed. Otherwise return it unchanged. The entries
+        and the walk are given as keyword arguments, so that run_tests finds
+        the walk over the changed entries in the keywords.
+
+        >>> from utils.sources import Entry
+        >>> @per_entry
+        ... def test_example(inflection, entries, walk=None):
+        ...     return []
+        >>> old, new = Entry("e1", {"ortografi": "katt"}), Entry("e2", {"ortografi": "hund"})
+        >>> cache = TestCache(Path("tests.cache"), [old, new], changed=[new], walk=EntryWalk([new]))
+        >>> cache.tests["test_example"] = (code_fingerprint(test_example), {})
+        >>> restricted = cache.restrict(partial(test_example, None, [old, new], walk=EntryWalk([old, new])))
+        >>> restricted.args, restricted.keywords["entries"] == [new], restricted.keywords["walk"] is cache.walk
+        ((None,), True, True)
+        """
+
+        if not is_per_entry(test) or not self._is_cached(test):
+            return test
+
+        if not isinstance(test, partial):
+            test = partial(test)
+
+        # Look the arguments up by name, since `entries` isn't always the first one
+        signature = inspect.signature(test.func)
+        arguments = signature.bind_partial(*test.args, **test.keywords).arguments
+        arguments["entries"] = self.changed
+        if "walk" in arguments:
+            arguments["walk"] = self.walk
+
+        # Keep the positional arguments before `entries` and pass the rest by keyword
+        args = test.args[: list(signature.parameters).index("entries")]
+        keywords = dict(list(arguments.items())[len(args) :])
+        return partial(test.func, *args, **keywords)
+
+    def complete(self, test, warnings):
+        """
+        Given the warnings from running a test (restricted by restrict()),
+        add the cached warnings for unchanged entries and remember the
+        warnings for next time. Returns the warnings of all entries.
+        """
+
+        if not is_per_entry(test):
+            return warnings
+
+        by_entry = defaultdict(list)
+        for w in warnings:
+            entry_id = warning_entry_id(w)
+            if entry_id is None:
+                raise ValueError(f"{func_name(test)} is marked as per-entry but made a warning without an entry: {w}")
+            by_entry[entry_id].append(w)
+
+        name = func_name(test)
+        cached = self._is_cached(test)
+        if cached:
+            _, cached_warnings = self.tests[name]
+            changed = {entry.id for entry in self.changed}
+            for entry in self.entries:
+                if entry.id not in changed:
+                    by_entry[entry.id] = cached_warnings.get(entry.id, [])
+
+        self.tests[name] = (
+            code_fingerprint(test),
+            {id: [ReportedWarning.from_warning(w) for w in ws] for id, ws in by_entry.items()},
+        )
+        self.completed.add(name)
+
+        if cached:
+            return [w for entry in self.entries for w in by_entry.get(entry.id, [])]
+        else:
+            return warnings
+
+    def save(self):
+        tests = {name: self.tests[name] for name in self.completed}
+        data = {"version": CACHE_VERSION, "hashes": self.hashes, "tests": tests}
+
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def _is_cached(self, test):
+        name = func_name(test)
+        return name in self.tests and self.tests[name][0] == code_fingerprint(test)
@@ -0,0 +1,82 @@
+"""
+Indexes over all entries that several tests need, such as the table of
+ids. Each index is built the first time a test asks for it and then
+shared by all tests in the run.
+"""
+
+from collections import defaultdict
+from functools import cached_property, partial
+from tqdm import tqdm
+from utils.salex import SO, SAOL, IdIndex
+from utils.reference_graph import ReferenceGraph
+
+
+def uses_indexes(*names):
+    """Decorator declaring which indexes (attributes of Indexes) a test uses."""
+
+    def decorate(test):
+        test.indexes = names
+        return test
+
+    return decorate
+
+
+class Indexes:
+    def __init__(self, entries, id_index_file=None, fingerprint=None):
+        """
+        If id_index_file is given, the id index is saved there and reused
+        by later runs on the snapshot with the given fingerprint.
+        """
+
+        self.entries = entries
+        self.id_index_file = id_index_file
+        self.fingerprint = fingerprint
+
+    def prepare(self, tests):
+        """Build all indexes that the given tests (marked with @uses_indexes) use."""
+
+        for test in tests:
+            while isinstance(test, partial):
+                test = test.func
+            for name in getattr(test, "indexes", ()):
+                getattr(self, name)
+
+    @cached_property
+    def id_index(self):
+        if self.id_index_file is not None:
+            return IdIndex.load(self.id_index_file, self.fingerprint, self.entries, progress=tqdm)
+        return IdIndex(self.entries, progress=tqdm)
+
+    @property
+    def ids(self):
+        """The location of each id. If an id occurs in several places, the best one is chosen."""
+        return self.id_index.best
+
+    @property
+    def all_ids(self):
+        """All locations of each id, except for duplicates that are reported by duplicate_ids."""
+        return self.id_index.locations
+
+    @property
+    def duplicate_ids(self):
+        """(id, entry, entry) for each id that occurs in two entries where neither is better."""
+        return self.id_index.duplicates
+
+    @cached_property
+    def reference_graph(self):
+        """The references between entries, see utils.reference_graph."""
+        return ReferenceGraph(self.entries, progress=tqdm)
+
+    @cached_property
+    def visible_by_ortografi(self):
+        """
+        For SO and SAOL, the entries that have a visible body in that
+        namespace, by ortografi.
+        """
+
+        result = {SO: defaultdict(list), SAOL: defaultdict(list)}
+        for entry in tqdm(self.entries, desc="Indexing words"):
+            for namespace, by_ortografi in result.items():
+                if namespace.path in entry.entry and entry.entry[namespace.path].get("visas", True):
+                    by_ortografi[entry.entry["ortografi"]].append(entry)
+        return {namespace: dict(by_ortografi) for namespace, by_ortografi in result.items()}
@@ -1,15 +1,11 @@
-from tqdm import tqdm
 from collections import defaultdict
-from utils.salex import is_visible
+from utils.salex import is_visible, EntryCache
 from karp.plugins.inflection_plugin import apply_rules, RuleNotPossible
 
 
 class Inflection:
-    def __init__(self, entry_queries, entries):
-        self.inflection_rules = {
-            entry.entry["name"]: entry.entry["definition"]
-            for entry in tqdm(entry_queries.all_entries("inflectionrules"), desc="Reading inflection rules")
-        }
+    def __init__(self, inflection_rules, entries):
+        self.inflection_rules = {entry.entry["name"]: entry.entry["definition"] for entry in inflection_rules}
 
         # Fetch inflection class from SAOL where a lemma is SO-only
         saol = defaultdict(set)
@@ -31,16 +27,20 @@ class Inflection:
                     dict[entry["ortografi"], word_class].add(entry["böjningsklass"])
 
         self.extra_inflection_classes = {k: v for k, v in saol.items() if k in so}
+        self.forms = EntryCache()
 
     def inflected_forms(self, entry, word=None, tag=False):
+        if word is None:
+            word = entry.entry["ortografi"]
+        forms = self.forms.get(entry, (word, tag), lambda: tuple(self._inflected_forms(entry, word, tag)))
+        return iter(forms)
+
+    def _inflected_forms(self, entry, word, tag):
         headword = entry.entry["ortografi"]
         word_class = entry.entry["ordklass"]
         if word_class == "ptv.":
             word_class = "verb"
 
-        if word is None:
-            word = headword
-
         if entry.entry["ingångstyp"] in ["partikelverb", "reflexivt_verb"]:
             suffix = word.split()[1:]
             word = word.split()[0]
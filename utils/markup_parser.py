@@ -3,16 +3,43 @@
 from lark import Lark, Transformer, LarkError
 from typing import Union, Iterator
 from dataclasses import dataclass
+from functools import lru_cache
+from array import array
+import re
 
-Markup = list[Union[str, "Element"]]
+# Trees returned by parse are shared between callers (see parse_cache_size),
+# so they are made of tuples and frozen Elements
+Markup = tuple[Union[str, "Element"], ...]
 
 
-@dataclass
+@dataclass(frozen=True)
 class Element:
     tag: str
     contents: Markup
 
 
+class MarkupError(LarkError):
+    """Raised by parse when the text isn't valid markup."""
+
+    def __init__(self, message, text, pos):
+        super().__init__(f"{message} at position {pos} in {text!r}")
+        self.text = text
+        self.pos = pos
+
+
+TAGS = frozenset(["b", "i", "u", "caps", "r", "rp", "sup", "sub", "källa"])
+
+# An opening tag, a closing bracket, or a run of text (where a backslash
+# escapes the next character, except for a newline)
+_token_regexp = re.compile(r"\[([^ \[\]\\]*) |(\])|((?:[^\[\]\\]|\\.)[^\[\]\\]*(?:\\.[^\[\]\\]*)*)")
+
+
+# How many parse results to remember. The same strings (inflections,
+# common definitions) turn up in many entries, and several tests parse
+# the same field.
+parse_cache_size = 2**16
+
+
 def parse(text: str) -> Markup:
     """
     Parse a markup string.
@@ -20,16 +47,331 @@ def parse(text: str) -> Markup:
     Example:
 
     >>> parse("hello [i this is] [b a simple [sup test]]")
-    ['hello ',
-     Element(tag='i', contents=['this is']),
+    ('hello ',
+     Element(tag='i', contents=('this is',)),
      ' ',
      Element(tag='b',
-             contents=['a simple ', Element(tag='sup', contents=['test'])])]
+             contents=('a simple ', Element(tag='sup', contents=('test',)))))
+
+    Gives the same result as parse_with_lark, except that errors are
+    reported as MarkupError (a kind of LarkError). The result may be
+    shared with other callers that parsed the same string.
+    """
+
+    # Most strings have no markup at all
+    if "[" not in text and "\\" not in text:
+        if "]" in text:
+            raise MarkupError("unexpected ]", text, text.index("]"))
+        return (text,) if text else ()
+
+    return _parse_markup(text)
+
+
+@lru_cache(maxsize=parse_cache_size)
+def _parse_markup(text):
+    contents = []
+    # The contents and tag of each enclosing element
+    stack = []
+    pos = 0
+    while pos < len(text):
+        match = _token_regexp.match(text, pos)
+        if match is None:
+            if text[pos] == "[":
+                raise MarkupError("expected a tag followed by a space", text, pos)
+            raise MarkupError("backslash at end of line", text, pos)
+
+        tag, close, run = match.groups()
+        if tag is not None:
+            if tag not in TAGS:
+                raise MarkupError(f"unknown tag {tag!r}", text, pos)
+            stack.append((contents, tag))
+            contents = []
+        elif close is not None:
+            if not stack:
+                raise MarkupError("unexpected ]", text, pos)
+            parent, tag = stack.pop()
+            parent.append(Element(tag=tag, contents=tuple(contents)))
+            contents = parent
+        else:
+            if "\\" in run:
+                run = _unescape(run)
+            contents.append(run)
+        pos = match.end()
+
+    if stack:
+        raise MarkupError(f"missing ] for [{stack[-1][1]}", text, pos)
+    return tuple(contents)
+
+
+# The kinds of event returned by events
+START = "start"
+END = "end"
+TEXT = "text"
+
+Event = tuple[str, str, tuple[str, ...]]
+
+
+def events(text: Union[str, Markup], tags: tuple[str, ...] = ()) -> Iterator[Event]:
+    """
+    Go through a markup string or tree, without building a tree, as a
+    stream of (kind, value, tags) events:
+
+    - (START, tag, tags) at the start of an element,
+    - (END, tag, tags) at the end of an element,
+    - (TEXT, text, tags) for a piece of text,
+
+    where `tags` are the tags of the enclosing elements, outermost first,
+    including the element itself for START and END. All events at the same
+    level share the same tags tuple. For a string that isn't valid markup,
+    MarkupError is raised when the error is reached.
+
+    Example:
+
+    >>> for event in events("hi [rp bla [i again]]"): print(event)
+    ('text', 'hi ', ())
+    ('start', 'rp', ('rp',))
+    ('text', 'bla ', ('rp',))
+    ('start', 'i', ('rp', 'i'))
+    ('text', 'again', ('rp', 'i'))
+    ('end', 'i', ('rp', 'i'))
+    ('end', 'rp', ('rp',))
+    """
+
+    if isinstance(text, str):
+        return _string_events(text, tags)
+    elif isinstance(text, CompactMarkup):
+        return text.events(tags)
+    else:
+        return _tree_events(text, tags)
+
+
+def _string_events(text, tags):
+    # Most strings have no markup at all
+    if "[" not in text and "\\" not in text:
+        if "]" in text:
+            raise MarkupError("unexpected ]", text, text.index("]"))
+        if text:
+            yield TEXT, text, tags
+        return
+
+    # The tags of each enclosing element
+    stack = []
+    pos = 0
+    while pos < len(text):
+        match = _token_regexp.match(text, pos)
+        if match is None:
+            if text[pos] == "[":
+                raise MarkupError("expected a tag followed by a space", text, pos)
+            raise MarkupError("backslash at end of line", text, pos)
+
+        tag, close, run = match.groups()
+        if tag is not None:
+            if tag not in TAGS:
+                raise MarkupError(f"unknown tag {tag!r}", text, pos)
+            stack.append(tags)
+            tags = tags + (tag,)
+            yield START, tag, tags
+        elif close is not None:
+            if not stack:
+                raise MarkupError("unexpected ]", text, pos)
+            yield END, tags[-1], tags
+            tags = stack.pop()
+        else:
+            if "\\" in run:
+                run = _unescape(run)
+            yield TEXT, run, tags
+        pos = match.end()
+
+    if stack:
+        raise MarkupError(f"missing ] for [{tags[-1]}", text, pos)
+
+
+def _tree_events(markup, tags):
+    # The remaining nodes and the tags of each enclosing element
+    stack = []
+    nodes = iter(markup)
+    while True:
+        for node in nodes:
+            if isinstance(node, str):
+                yield TEXT, node, tags
+            else:
+                stack.append((nodes, tags))
+                tags = tags + (node.tag,)
+                yield START, node.tag, tags
+                nodes = iter(node.contents)
+                break
+        else:
+            if not stack:
+                return
+            yield END, tags[-1], tags
+            nodes, tags = stack.pop()
+
+
+def parse_cache_statistics() -> dict:
+    """How well the parse cache has worked so far in this process."""
+
+    info = _parse_markup.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / lookups if lookups else None,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
+
+
+def clear_parse_cache():
+    _parse_markup.cache_clear()
+
+
+def _unescape(text):
+    # Exactly what the Lark transformer does
+    return text.replace(r"\[", "[").replace(r"\]", "]").replace(r"\\", "\\")
+
+
+# The kinds of MarkupProblem
+UNCLOSED_TAG = "unclosed tag"
+UNKNOWN_TAG = "unknown tag"
+STRAY_CLOSE = "stray ]"
+BAD_ESCAPE = "backslash at end of line"
+
+
+@dataclass(frozen=True)
+class MarkupProblem:
+    """A mistake in a markup string, as found by parse_tolerant."""
+
+    kind: str
+    pos: int
+    # The markup in question: the tag name for UNCLOSED_TAG, and the text
+    # that was kept as it is for the others
+    text: str
+
+
+# Like _token_regexp, but also matches a [ that doesn't start a valid tag,
+# and a backslash that doesn't escape anything
+_tolerant_token_regexp = re.compile(r"\[([^ \[\]\\]*)( ?)|(\])|((?:[^\[\]\\]|\\.)[^\[\]\\]*(?:\\.[^\[\]\\]*)*)|(\\)")
+
+
+def parse_tolerant(text: str) -> tuple[Markup, list[MarkupProblem]]:
+    """
+    Parse a markup string that may have mistakes in it, returning the
+    best tree that can be made of it and a list of the problems found
+    (empty if the markup is valid, in which case the tree is that of parse).
+
+    An unknown tag, a ] without a [ and a backslash at the end of a line
+    are kept as text (along with the ] that closes the unknown tag), and
+    unclosed tags are closed at the end of the string.
+
+    Example:
+
+    >>> parse_tolerant("[i katt] [se ovan] [b hund")
+    ((Element(tag='i', contents=('katt',)), ' [se ovan] ', Element(tag='b', contents=('hund',))),
+     [MarkupProblem(kind='unknown tag', pos=9, text='[se '),
+      MarkupProblem(kind='unclosed tag', pos=19, text='b')])
+    """
+
+    try:
+        return parse(text), []
+    except MarkupError:
+        pass
+
+    problems = []
+    contents = []
+    # The contents, tag and position of each enclosing element. The tag is
+    # None for an unknown tag, which doesn't get an element of its own.
+    stack = []
+    for match in _tolerant_token_regexp.finditer(text):
+        tag, space, close, run, backslash = match.groups()
+        pos = match.start()
+        if tag is not None:
+            if space and tag in TAGS:
+                stack.append((contents, tag, pos))
+                contents = []
+            else:
+                problems.append(MarkupProblem(UNKNOWN_TAG, pos, match.group()))
+                stack.append((contents, None, pos))
+                _append_text(contents, match.group())
+        elif close is not None:
+            if not stack:
+                problems.append(MarkupProblem(STRAY_CLOSE, pos, close))
+                _append_text(contents, close)
+                continue
+            parent, tag, _ = stack.pop()
+            if tag is None:
+                _append_text(contents, close)
+            else:
+                parent.append(Element(tag=tag, contents=tuple(contents)))
+                contents = parent
+        elif run is not None:
+            _append_text(contents, _unescape(run) if "\\" in run else run)
+        else:
+            problems.append(MarkupProblem(BAD_ESCAPE, pos, backslash))
+            _append_text(contents, backslash)
+
+    while stack:
+        parent, tag, pos = stack.pop()
+        if tag is not None:
+            problems.append(MarkupProblem(UNCLOSED_TAG, pos, tag))
+            parent.append(Element(tag=tag, contents=tuple(contents)))
+            contents = parent
+
+    problems.sort(key=lambda problem: problem.pos)
+    return tuple(contents), problems
+
+
+def _append_text(contents, text):
+    # Keep neighbouring pieces of text together, as parse does
+    if contents and isinstance(contents[-1], str):
+        contents[-1] += text
+    else:
+        contents.append(text)
+
+
+def parse_with_lark(text: str) -> Markup:
+    """
+    Parse a markup string using the Lark grammar below. Slower than parse,
+    but kept as a reference to check it against (see lark_differences).
     """
 
     return parser.parse(text)
 
 
+def lark_differences(texts) -> Iterator[tuple[str, object, object]]:
+    r"""
+    Parse each text with both parse and parse_with_lark, and yield
+    (text, result of parse, result of parse_with_lark) for the texts where
+    they differ. A text that a parser rejects gives LarkError as its result.
+
+    >>> corpus = [
+    ...     "",
+    ...     "plain text",
+    ...     "a [i b] c",
+    ...     "[b a simple [sup test]] [källa k]",
+    ...     "[i ]",
+    ...     "x\n[i y\nz]",
+    ...     r"escaped \[ \] \\ and \q",
+    ...     "[i unclosed",
+    ...     "stray ]",
+    ...     "[x unknown tag]",
+    ...     "[i]",
+    ...     "trailing \\",
+    ... ]
+    >>> list(lark_differences(corpus))
+    []
+    """
+
+    for text in texts:
+        results = []
+        for parse_function in [parse, parse_with_lark]:
+            try:
+                results.append(parse_function(text))
+            except LarkError:
+                results.append(LarkError)
+        if results[0] != results[1]:
+            yield text, *results
+
+
 GRAMMAR = r"""
     ?start: markup
     markup: element*
@@ -43,7 +385,7 @@ GRAMMAR = r"""
 
 
 class MarkupTransformer(Transformer):
-    markup = lambda _, args: args  # noqa: E731
+    markup = lambda _, args: tuple(args)  # noqa: E731
     tag = lambda _, args: Element(tag=args[0].value, contents=args[1])  # noqa: E731
     text = lambda _, args: args[0].value  # noqa: E731
     TEXT = lambda _, tok: tok.update(value=tok.replace(r"\[", "[").replace(r"\]", "]").replace(r"\\", "\\"))  # noqa: E731
@@ -52,6 +394,168 @@ class MarkupTransformer(Transformer):
 parser = Lark(GRAMMAR, parser="lalr", transformer=MarkupTransformer())
 
 
+# The codes used by CompactMarkup: one per event, with the start of an
+# element coded by its tag
+_TEXT_CODE = 0
+_END_CODE = 1
+_TAG_NAMES = sorted(TAGS)
+_TAG_CODES = {tag: i + 2 for i, tag in enumerate(_TAG_NAMES)}
+
+
+class CompactMarkup:
+    """
+    A parsed markup string, stored compactly instead of as a tree of
+    Elements. The events (see events) are kept as one byte each, and the
+    text as a single string (the text_contents of the markup) with an
+    array of where each piece of text ends. A plain string with no markup
+    shares its text with the original string.
+
+    Iterating over it gives the top-level nodes, with elements as
+    CompactElement views that share the same storage. It converts to and
+    from Markup without loss (CompactMarkup.from_tree and tree), and can
+    be passed to events, text_contents and to_markup.
+    """
+
+    __slots__ = ("text", "_codes", "_ends", "_first", "_last")
+
+    def __init__(self, text, codes, ends, first=0, last=None):
+        self.text = text
+        self._codes = codes
+        self._ends = ends
+        # The events covered by this view
+        self._first = first
+        self._last = len(codes) if last is None else last
+
+    @classmethod
+    def parse(cls, text: str) -> "CompactMarkup":
+        """Parse a markup string, raising MarkupError if it isn't valid."""
+
+        if "[" not in text and "\\" not in text and "]" not in text:
+            return cls(text, bytes([_TEXT_CODE]) if text else b"", array("I", [len(text)] if text else []))
+        return cls._from_events(_string_events(text, ()))
+
+    @classmethod
+    def from_tree(cls, markup: Markup) -> "CompactMarkup":
+        return cls._from_events(_tree_events(markup, ()))
+
+    @classmethod
+    def _from_events(cls, events):
+        texts = []
+        codes = bytearray()
+        ends = array("I")
+        length = 0
+        for kind, value, _ in events:
+            if kind == TEXT:
+                texts.append(value)
+                length += len(value)
+                codes.append(_TEXT_CODE)
+                ends.append(length)
+            elif kind == START:
+                if value not in _TAG_CODES:
+                    raise ValueError(f"unknown tag {value!r}")
+                codes.append(_TAG_CODES[value])
+            else:
+                codes.append(_END_CODE)
+        return cls("".join(texts), bytes(codes), ends)
+
+    def _text_position(self, event):
+        # The number of pieces of text before an event, and where the next one starts
+        count = self._codes.count(_TEXT_CODE, 0, event)
+        return count, self._ends[count - 1] if count else 0
+
+    def events(self, tags: tuple[str, ...] = ()) -> Iterator[Event]:
+        count, start = self._text_position(self._first)
+        # The tags of each enclosing element
+        stack = []
+        for code in self._codes[self._first : self._last]:
+            if code == _TEXT_CODE:
+                end = self._ends[count]
+                count += 1
+                yield TEXT, self.text[start:end], tags
+                start = end
+            elif code == _END_CODE:
+                yield END, tags[-1], tags
+                tags = stack.pop()
+            else:
+                stack.append(tags)
+                tags = tags + (_TAG_NAMES[code - 2],)
+                yield START, tags[-1], tags
+
+    def text_contents(self) -> str:
+        if self._first == 0 and self._last == len(self._codes):
+            return self.text
+        _, start = self._text_position(self._first)
+        _, end = self._text_position(self._last)
+        return self.text[start:end]
+
+    def tree(self) -> Markup:
+        """Convert to an ordinary tree of Elements."""
+
+        contents = []
+        # The contents of each enclosing element
+        stack = []
+        for kind, value, _ in self.events():
+            if kind == TEXT:
+                contents.append(value)
+            elif kind == START:
+                stack.append(contents)
+                contents = []
+            else:
+                parent = stack.pop()
+                parent.append(Element(tag=value, contents=tuple(contents)))
+                contents = parent
+        return tuple(contents)
+
+    def __iter__(self) -> Iterator[Union[str, "CompactElement"]]:
+        codes = self._codes
+        count, start = self._text_position(self._first)
+        event = self._first
+        while event < self._last:
+            code = codes[event]
+            if code == _TEXT_CODE:
+                end = self._ends[count]
+                count += 1
+                yield self.text[start:end]
+                start = end
+                event += 1
+            else:
+                # Find the end of the element
+                depth = 1
+                end_event = event + 1
+                while depth:
+                    if codes[end_event] == _END_CODE:
+                        depth -= 1
+                    elif codes[end_event] != _TEXT_CODE:
+                        depth += 1
+                    end_event += 1
+                contents = CompactMarkup(self.text, codes, self._ends, event + 1, end_event - 1)
+                yield CompactElement(_TAG_NAMES[code - 2], contents)
+                count, start = self._text_position(end_event)
+                event = end_event
+
+    def __eq__(self, other):
+        if isinstance(other, CompactMarkup):
+            return self.tree() == other.tree()
+        return NotImplemented
+
+    def __repr__(self):
+        return f"CompactMarkup({to_markup(self)!r})"
+
+
+class CompactElement:
+    """An element of a CompactMarkup, with the same fields as Element."""
+
+    __slots__ = ("tag", "contents")
+    __match_args__ = ("tag", "contents")
+
+    def __init__(self, tag: str, contents: CompactMarkup):
+        self.tag = tag
+        self.contents = contents
+
+    def __repr__(self):
+        return f"CompactElement(tag={self.tag!r}, contents={self.contents!r})"
+
+
 @dataclass
 class Fragment:
     """A piece of text annotated with which tags it's surrounded by."""
@@ -60,6 +564,22 @@ class Fragment:
     tags: list[str]
 
 
+def text_runs(text: Union[str, "Markup"], tags: tuple[str, ...] = ()) -> Iterator[tuple[str, tuple[str, ...]]]:
+    """
+    The pieces of text in a markup string or tree, as (text, tags) pairs,
+    where tags are the tags the text is surrounded by. Like text_fragments,
+    an empty element gives an empty text.
+    """
+
+    just_started = False
+    for kind, value, tags in events(text, tags):
+        if kind == TEXT:
+            yield value, tags
+        elif kind == END and just_started:  # special case for empty tags
+            yield "", tags
+        just_started = kind == START
+
+
 def text_fragments(text: Union[str, "Markup"], tags=None) -> Iterator[Fragment]:
     """
     Returns the text contained in a markup string or tree, but where each text is
@@ -75,19 +595,8 @@ def text_fragments(text: Union[str, "Markup"], tags=None) -> Iterator[Fragment]:
     Fragment(text='more', tags=['sub'])
     """
 
-    if tags is None:
-        tags = []
-    if isinstance(text, str):
-        text = parser.parse(text)
-
-    for elt in text:
-        if isinstance(elt, str):
-            yield Fragment(elt, tags)
-        else:
-            if not elt.contents:  # special case for empty tags
-                yield Fragment("", tags + [elt.tag])
-            else:
-                yield from text_fragments(elt.contents, tags + [elt.tag])
+    for run, run_tags in text_runs(text, tuple(tags or ())):
+        yield Fragment(run, list(run_tags))
 
 
 def text_contents(text: Union[str, "Markup"]) -> str:
@@ -95,7 +604,9 @@ def text_contents(text: Union[str, "Markup"]) -> str:
     Returns the text contained in a markup string or tree.
     """
 
-    return "".join(fragment.text for fragment in text_fragments(text))
+    if isinstance(text, CompactMarkup):
+        return text.text_contents()
+    return "".join(value for kind, value, _ in events(text) if kind == TEXT)
 
 
 def to_markup(text: Union[str, "Markup"]) -> str:
@@ -105,19 +616,31 @@ def to_markup(text: Union[str, "Markup"]) -> str:
     if isinstance(text, str):
         return text.replace("\\", "\\\\").replace("[", "\\[").replace("]", "\\]")
 
-    elif isinstance(text, list):
+    elif isinstance(text, (list, tuple)):
         return "".join(to_markup(elt) for elt in text)
 
+    elif isinstance(text, CompactMarkup):
+        parts = []
+        for kind, value, _ in text.events():
+            if kind == TEXT:
+                parts.append(to_markup(value))
+            elif kind == START:
+                parts.append(f"[{value} ")
+            else:
+                parts.append("]")
+        return "".join(parts)
+
     else:
         return f"[{text.tag} {to_markup(text.contents)}]"
 
 
 def strip_markup(text: Union[str, "Markup"]) -> str:
     """
-    Strip all markup from a markup string, returning plain text.
+    Strip all markup from a markup string, returning plain text. Markup
+    with mistakes in it is read as by parse_tolerant.
     """
     try:
-        tree = parser.parse(text)
-        return text_contents(tree)
+        return text_contents(text)
     except LarkError:
-        return text
+        tree, _ = parse_tolerant(text)
+        return text_contents(tree)
@@ -0,0 +1,54 @@
+"""Running tests in parallel, in a pool of forked worker processes."""
+
+import gc
+import multiprocessing
+from utils.testing import ReportedWarning
+from utils.timing import run_test
+
+# The tests being run. Set before the pool is started, so that the workers
+# inherit them (and the entries they refer to) when they are forked.
+_tests = None
+
+
+def _run_test(i):
+    warnings, stats = run_test(_tests[i])
+    return [ReportedWarning.from_warning(w) for w in warnings], stats
+
+
+def run_tests_parallel(tests, jobs, serial=()):
+    """
+    Run the tests in a pool of `jobs` worker processes. Yields the warnings
+    and statistics (see utils.timing) of each test, in the same order as
+    the tests, as soon as the test has finished. The statistics are
+    measured in the process that ran the test.
+
+    The workers are forked, so they share the entries with this process
+    (copy-on-write) instead of receiving a copy of them. The warnings are
+    sent back as ReportedWarnings, which don't refer to any entries.
+
+    Tests in `serial` are run in this process before the pool is started.
+    This is needed for tests whose side effects other tests depend on,
+    since a worker only sees the state at the time it was forked, and for
+    tests that write to files opened by this process.
+    """
+
+    global _tests
+
+    serial_results = {i: run_test(t) for i, t in enumerate(tests) if t in serial}
+    parallel = [i for i in range(len(tests)) if i not in serial_results]
+
+    _tests = tests
+    # Keep the garbage collector from touching (and thereby copying)
+    # every object the workers inherit.
+    gc.freeze()
+    try:
+        with multiprocessing.get_context("fork").Pool(jobs) as pool:
+            parallel_results = pool.imap(_run_test, parallel, chunksize=1)
+            for i in range(len(tests)):
+                if i in serial_results:
+                    yield serial_results.pop(i)
+                else:
+                    yield next(parallel_results)
+    finally:
+        gc.unfreeze()
+        _tests = None
@@ -0,0 +1,116 @@
+"""
+The graph of references between entries, for answering "which entries
+point at this id?" without scanning the whole lexicon.
+
+The edges are stored in compressed sparse row form: for entry number i,
+the ids it refers to are targets[forward_targets[forward_offsets[i]:forward_offsets[i + 1]]],
+and likewise for the reverse edges. This keeps the graph for all of Salex
+in a few integer arrays.
+"""
+
+from array import array
+from utils.salex import Id, IdLocation, find_ids, find_refs
+
+
+class ReferenceGraph:
+    """
+    The references (as found by find_refs) from each entry to each id,
+    including references in hidden parts of entries. An entry that refers
+    to the same id several times has only one edge to it.
+
+    Entries are looked up by entry or entry id, and targets by Id:
+
+    >>> from karp.lex.domain.dtos import EntryDto
+    >>> from utils.salex import SO, TEXT, TextId
+    >>> katt = {"ortografi": "katt", "so": {"huvudbetydelser": [{"definition": "jfr [i kisse]"}]}}
+    >>> katt = EntryDto(id="e1", entry=katt, resource="salex", version=1)
+    >>> kisse = EntryDto(id="e2", entry={"ortografi": "kisse", "so": {"l_nr": 2}}, resource="salex", version=1)
+    >>> graph = ReferenceGraph([katt, kisse])
+    >>> graph.references_from(katt)
+    [Id(namespace=salex.SO, type=salex.TEXT, id=TextId(ortografi='kisse', homografNr=None))]
+    >>> [entry.id for entry in graph.referrers(Id(SO, TEXT, TextId("kisse", None)))]
+    ['e1']
+    >>> [loc.text for loc in graph.references_to(Id(SO, TEXT, TextId("kisse", None)))]
+    ['[i kisse]']
+    >>> [(id.id.ortografi, [e.id for e in entries]) for id, entries in graph.entry_referrers("e2").items()]
+    [('kisse', ['e1'])]
+    >>> graph.referrers(Id(SO, TEXT, TextId("hund", None)))
+    []
+    """
+
+    def __init__(self, entries, progress=lambda x, desc: x):
+        self.entries = entries
+        self.positions = {entry.id: i for i, entry in enumerate(entries)}
+        # The ids referred to by any entry, and their numbers
+        self.targets: list[Id] = []
+        self.target_numbers: dict[Id, int] = {}
+
+        self.forward_offsets = array("q", [0])
+        self.forward_targets = array("l")
+        for entry in progress(entries, desc="Finding references"):
+            seen = set()
+            for ref, _ in find_refs(entry):
+                number = self.target_numbers.get(ref)
+                if number is None:
+                    number = self.target_numbers[ref] = len(self.targets)
+                    self.targets.append(ref)
+                if number not in seen:
+                    seen.add(number)
+                    self.forward_targets.append(number)
+            self.forward_offsets.append(len(self.forward_targets))
+
+        # Counting sort of the edges by target gives the reverse edges, with
+        # the entries for each target in the same order as in `entries`
+        counts = array("q", [0]) * (len(self.targets) + 1)
+        for number in self.forward_targets:
+            counts[number + 1] += 1
+        for i in range(len(self.targets)):
+            counts[i + 1] += counts[i]
+        self.reverse_offsets = array("q", counts)
+        self.reverse_sources = array("l", [0]) * len(self.forward_targets)
+        for source in range(len(entries)):
+            for k in range(self.forward_offsets[source], self.forward_offsets[source + 1]):
+                number = self.forward_targets[k]
+                self.reverse_sources[counts[number]] = source
+                counts[number] += 1
+
+    def _position(self, entry):
+        if isinstance(entry, Id):
+            raise TypeError(f"expected an entry or entry id, not {entry}; use referrers to look up an Id")
+        return self.positions[entry if isinstance(entry, str) else entry.id]
+
+    def references_from(self, entry) -> list[Id]:
+        """The ids an entry (or entry id) refers to."""
+
+        i = self._position(entry)
+        return [self.targets[n] for n in self.forward_targets[self.forward_offsets[i] : self.forward_offsets[i + 1]]]
+
+    def referrers(self, id: Id) -> list:
+        """The entries that refer to an id."""
+
+        number = self.target_numbers.get(id)
+        if number is None:
+            return []
+        start, end = self.reverse_offsets[number], self.reverse_offsets[number + 1]
+        return [self.entries[i] for i in self.reverse_sources[start:end]]
+
+    def references_to(self, id: Id) -> list[IdLocation]:
+        """Where the entries that refer to an id do so."""
+
+        return [loc for entry in self.referrers(id) for ref, loc in find_refs(entry) if ref == id]
+
+    def entry_referrers(self, entry) -> dict[Id, list]:
+        """
+        For each id defined in an entry that something refers to, the
+        entries that refer to it, not counting the entry itself. These are
+        the entries affected if the entry is removed.
+        """
+
+        result = {}
+        entry_id = entry if isinstance(entry, str) else entry.id
+        entry = self.entries[self._position(entry)]
+        for id, _ in find_ids(entry):
+            referrers = [e for e in self.referrers(id) if e.id != entry_id]
+            if referrers:
+                result[id] = referrers
+        return result
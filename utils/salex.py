@@ -3,8 +3,15 @@
 import karp.foundation.json as json
 from copy import deepcopy
 from enum import Enum, global_enum
-from dataclasses import dataclass
+from collections import defaultdict, OrderedDict
+from dataclasses import dataclass, field as dc_field, FrozenInstanceError
+from functools import cache, cached_property, lru_cache
+from pathlib import Path
+import hashlib
+import os
+import pickle
 import re
+import weakref
 from karp.lex.domain.dtos import EntryDto
 import utils.markup_parser as markup_parser
 import lark
@@ -21,11 +28,82 @@ def entry_is_visible_in_printed_book(entry):
     return entry_is_visible(entry) and not entry.get("endastDigitalt", False)
 
 
+# (data, hidden prefixes) by (id(data), test), for the most recently used
+# data. The data is kept so that its id isn't reused while it is in the
+# cache. Entry bodies are cached with their entry by entry_hidden_prefixes.
+_hidden_prefixes = OrderedDict()
+_max_hidden_prefixes = 4096
+_no_prefixes = frozenset()
+
+
+def _find_hidden_prefixes(data, test):
+    result = []
+
+    def visit(path, value):
+        if isinstance(value, dict):
+            if not test(value):
+                # Everything below is hidden anyway
+                result.append(path)
+                return
+            for key, child in value.items():
+                visit(path + (key,), child)
+        elif isinstance(value, list):
+            for i, child in enumerate(value):
+                visit(path + (i,), child)
+
+    visit((), data)
+    return frozenset(result) if result else _no_prefixes
+
+
+def hidden_prefixes(data, test=entry_is_visible):
+    """
+    The paths (as tuples) of the outermost dictionaries in data that are
+    hidden according to test. Computed in one pass over data and cached
+    for the most recently used data, so if data is modified in a way that
+    changes its visibility, call clear_visibility_cache().
+    """
+
+    if not data:
+        # Not worth caching, and often a temporary {}
+        return _find_hidden_prefixes(data, test)
+
+    key = (id(data), test)
+    cached = _hidden_prefixes.get(key)
+    if cached is not None and cached[0] is data:
+        _hidden_prefixes.move_to_end(key)
+        return cached[1]
+
+    result = _find_hidden_prefixes(data, test)
+    _hidden_prefixes[key] = (data, result)
+    if len(_hidden_prefixes) > _max_hidden_prefixes:
+        _hidden_prefixes.popitem(last=False)
+    return result
+
+
+def clear_visibility_cache():
+    _hidden_prefixes.clear()
+
+
 def is_visible(path, entry, test=entry_is_visible):
-    path = json.make_path(path)
-    for i in range(len(path) + 1):
-        subpath = json.get_path(path[:i], entry)
-        if isinstance(subpath, dict) and not test(subpath):
+    return _is_visible(path, hidden_prefixes(entry, test))
+
+
+def is_visible_in_entry(path, entry, namespace=None, test=entry_is_visible):
+    """Like is_visible(path, body), where body is the namespace body of entry (or its whole body)."""
+
+    return _is_visible(path, entry_hidden_prefixes(entry, namespace, test))
+
+
+def _is_visible(path, hidden):
+    if not hidden:
+        return True
+
+    prefix = ()
+    if prefix in hidden:
+        return False
+    for key in json.make_path(path):
+        prefix += (key,)
+        if prefix in hidden:
             return False
 
     return True
@@ -46,6 +124,98 @@ def visible_part(data, test=entry_is_visible):
     return data
 
 
+class EntryCache:
+    """
+    A cache of values computed from entries, kept for the whole run.
+
+    Values are looked up by entry id, but are only reused as long as the
+    entry still has the same body object, so a modified copy of an entry
+    (e.g. made with deepcopy) doesn't see the values of the original.
+    If an entry is modified in place, call invalidate_entry().
+    """
+
+    instances = weakref.WeakSet()
+
+    def __init__(self):
+        self._cache = {}
+        EntryCache.instances.add(self)
+
+    def get(self, entry, key, compute):
+        body, values = self._cache.get(entry.id, (None, None))
+        if body is not entry.entry:
+            values = {}
+            self._cache[entry.id] = (entry.entry, values)
+
+        if key not in values:
+            values[key] = compute()
+        return values[key]
+
+    def invalidate(self, entry=None):
+        if entry is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(entry.id, None)
+
+
+visible_views = EntryCache()
+
+# Values derived from entries, such as their variant forms, which several
+# tests need
+derived_data = EntryCache()
+
+
+def invalidate_entry(entry=None):
+    """Forget everything cached about an entry (or all entries), after it has been modified in place."""
+
+    for entry_cache in list(EntryCache.instances):
+        entry_cache.invalidate(entry)
+    clear_visibility_cache()
+
+
+def entry_hidden_prefixes(entry, namespace=None, test=entry_is_visible):
+    """
+    Like hidden_prefixes for the namespace body of an entry (or its whole
+    body), but cached with the entry, for the whole run.
+    """
+
+    def compute():
+        body = entry.entry if namespace is None else entry.entry.get(namespace.path, {})
+        return _find_hidden_prefixes(body, test)
+
+    return visible_views.get(entry, ("hidden_prefixes", namespace, test), compute)
+
+
+def visible_entry(entry, test=entry_is_visible):
+    """
+    The visible part of an entry's body, i.e. visible_part(entry.entry, test).
+
+    Computed once per entry and test, and shared between all callers, so
+    the result must not be modified.
+    """
+
+    return visible_views.get(entry, test, lambda: visible_part(entry.entry, test))
+
+
+def visible_namespace(entry, namespace, test=entry_is_visible):
+    """
+    The visible part of an entry's SO or SAOL body, i.e.
+    visible_part(entry.entry.get(namespace.path), test), or None if the
+    entry has no such body.
+
+    Shared between all callers like visible_entry, so the result must not
+    be modified.
+    """
+
+    body = visible_entry(entry, test)
+    if namespace.path in body:
+        return body[namespace.path]
+    elif namespace.path in entry.entry:
+        # The body itself is invisible, so it isn't part of visible_entry.
+        return visible_views.get(entry, (test, namespace), lambda: visible_part(entry.entry[namespace.path], test))
+    else:
+        return None
+
+
 @global_enum
 class Namespace(Enum):
     SO = 0
@@ -70,12 +240,81 @@ class IdType(Enum):
     UNKNOWN = 5
 
 
-@dataclass(frozen=True)
-class Id:
+class _Interned:
+    """
+    Base class for small immutable values that are created in large
+    numbers and used as dictionary keys. Equal values are interned, i.e.
+    share a single object, and the hash is computed only once. Behaves
+    like a frozen dataclass with the fields listed in _fields.
+    """
+
+    __slots__ = ("_hash",)
+    _fields = ()
+    _interned = None
+
+    def __init_subclass__(cls):
+        cls._interned = {}
+        cls.__match_args__ = cls._fields
+
+    @classmethod
+    def _intern(cls, *values):
+        try:
+            result = cls._interned.get(values)
+        except TypeError:  # unhashable field, so can't be interned
+            result = cls._make(values, None)
+        else:
+            if result is None:
+                result = cls._interned[values] = cls._make(values, hash(values))
+        return result
+
+    @classmethod
+    def _make(cls, values, hash_value):
+        result = object.__new__(cls)
+        for name, value in zip(cls._fields, values):
+            object.__setattr__(result, name, value)
+        object.__setattr__(result, "_hash", hash_value)
+        return result
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f"cannot assign to field {name!r}")
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f"cannot delete field {name!r}")
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self):
+        if self._hash is None:
+            return hash(self._values())
+        return self._hash
+
+    def __reduce__(self):
+        return (self.__class__, self._values())
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{self.__class__.__qualname__}({fields})"
+
+
+class Id(_Interned):
+    __slots__ = ("namespace", "type", "id")
+    _fields = __slots__
+
     namespace: Namespace
     type: IdType
     id: Union[str, "TextId"]
 
+    def __new__(cls, namespace, type, id):
+        return cls._intern(namespace, type, id)
+
     def format(self):
         match self.type:
             case IdType.LNR:
@@ -92,41 +331,70 @@ class Id:
                 return f"(okänt format) {self.id}"
 
 
-@dataclass(frozen=True)
-class TextId:
+class TextId(_Interned):
+    __slots__ = ("ortografi", "homografNr")
+    _fields = __slots__
+
     ortografi: str
     homografNr: int | None
     # TODO also add lemmaNr: int | None for e.g. [i katt 1]
     # Not included now because not sure how it works if some huvudbetydelser have visas=False
 
+    def __new__(cls, ortografi, homografNr):
+        return cls._intern(ortografi, homografNr)
+
     def format(self):
         return " ".join(str(x) for x in [self.homografNr, self.ortografi] if x is not None)
 
 
-@dataclass
+@dataclass(slots=True)
 class IdLocation:
     entry: EntryDto
     namespace: Namespace
     path: list[str]
     text: str
+    # The properties below are computed on first use
+    _visible: bool | None = dc_field(default=None, init=False, repr=False, compare=False)
+    _field: str | None = dc_field(default=None, init=False, repr=False, compare=False)
+    _ortografi: str | None = dc_field(default=None, init=False, repr=False, compare=False)
 
     @property
     def visible(self):
-        return is_visible(self.path, self.entry.entry.get(self.namespace.path, {}))
+        if self._visible is None:
+            self._visible = is_visible_in_entry(self.path, self.entry, self.namespace)
+        return self._visible
 
     @property
     def field(self):
-        return json.path_str(self.path, strip_positions=True)
+        if self._field is None:
+            self._field = json.path_str(self.path, strip_positions=True)
+        return self._field
 
     @property
     def ortografi(self):
-        path = [self.namespace.path] + self.path
-        body = self.entry.entry
-        while path and not json.has_path(path + ["ortografi"], body):
-            path = path[:-1]
+        """The ortografi of the innermost part of the entry containing this location."""
+
+        if self._ortografi is None:
+            self._ortografi = self._find_ortografi()
+        return self._ortografi
+
+    def _find_ortografi(self):
+        data = self.entry.entry
+        result = data.get("ortografi") if isinstance(data, dict) else None
+        found = isinstance(data, dict) and "ortografi" in data
+        for key in [self.namespace.path] + self.path:
+            try:
+                data = data[key]
+            except (KeyError, IndexError, TypeError):
+                break
+            if isinstance(data, dict) and "ortografi" in data:
+                result = data["ortografi"]
+                found = True
+        if found:
+            return result
 
         try:
-            return json.get_path(path + ["ortografi"], body)
+            return json.get_path(["ortografi"], self.entry.entry)
         except:
             breakpoint()
             raise
@@ -193,6 +461,54 @@ freetext_fields = {
 }
 
 
+def _compile_path(keys):
+    # Returns a generator function taking (data, path so far, visibility test
+    # or None) and yielding (path, value) for the rest of the path, like
+    # json.expand_path followed by json.get_path
+    if not keys:
+
+        def leaf(data, path, test):
+            if isinstance(data, list):
+                for i, item in enumerate(data):
+                    yield from leaf(item, path + [i], test)
+            elif test is None or not isinstance(data, dict) or test(data):
+                yield path, data
+
+        return leaf
+
+    key = keys[0]
+    rest = _compile_path(keys[1:])
+
+    def step(data, path, test):
+        if isinstance(data, list):
+            for i, item in enumerate(data):
+                yield from step(item, path + [i], test)
+        elif isinstance(data, dict) and key in data:
+            if test is None or test(data):
+                yield from rest(data[key], path + [key], test)
+
+    return step
+
+
+@cache
+def field_accessor(field):
+    """
+    Compile a field such as "huvudbetydelser.x_nr" into a function
+    accessor(data, visible_only=False, test=entry_is_visible), which yields
+    (path, value) for each occurrence of the field in data, in the same
+    order as json.expand_path. With visible_only, parts of data that are
+    hidden according to test are skipped (as with is_visible). The empty
+    field gives the data itself.
+    """
+
+    find = _compile_path(tuple(field.split(".")) if field else ())
+
+    def accessor(data, visible_only=False, test=entry_is_visible):
+        return find(data, [], test if visible_only else None)
+
+    return accessor
+
+
 def find_ids(entry):
     for namespace in id_fields:
         if namespace.path not in entry.entry:
@@ -200,8 +516,7 @@ def find_ids(entry):
         sub_entry = entry.entry[namespace.path]
 
         for field, kind in id_fields[namespace].items():
-            for path in json.expand_path(field, sub_entry):
-                value = json.get_path(path, sub_entry)
+            for path, value in field_accessor(field)(sub_entry):
                 yield Id(namespace, kind, value), IdLocation(entry, namespace, path, value)
 
         yield from text_ids(entry, namespace, include_linked=False)
@@ -211,20 +526,22 @@ def text_ids(entry, namespace, include_linked=True):
     sub_entry = entry.entry.get(namespace.path, {})
     for field, kind in id_fields[namespace].items():
         if kind == LNR:
-            for path in json.expand_path(field, sub_entry):
-                parent = path[:-1]
-                if not include_linked and json.has_path(parent + ["moderverb"], sub_entry):
+            # Visit the dictionaries containing the field, to get at their
+            # ortografi and homografNr without walking down from the top again
+            parent_field, _, key = field.rpartition(".")
+            for parent, parent_body in field_accessor(parent_field)(sub_entry):
+                if not isinstance(parent_body, dict) or key not in parent_body:
+                    continue
+                path = parent + [key]
+                if not include_linked and "moderverb" in parent_body:
                     continue
 
                 if not parent:  # top-level entry
                     ortografi = entry.entry["ortografi"]
                 else:
-                    ortografi = json.get_path(parent + ["ortografi"], sub_entry)
+                    ortografi = parent_body["ortografi"]
 
-                if json.has_path(parent + ["homografNr"], sub_entry):
-                    homografNr = json.get_path(parent + ["homografNr"], sub_entry)
-                else:
-                    homografNr = None
+                homografNr = parent_body.get("homografNr")
 
                 id = Id(namespace, TEXT, TextId(ortografi, homografNr))
                 loc = IdLocation(entry, namespace, path, id.format())
@@ -252,6 +569,104 @@ text_xnr_regexp = re.compile(r"(.*)\s+([0-9]+)")
 ref_regexp = re.compile(r"(?<=refid=)[a-zA-Z0-9]*")
 full_ref_regexp = re.compile(r"\+[^ +]+\(refid=([a-zA-Z0-9]*)\)")
 
+# +hund(refid=lnr123456)-style references, and things that look like
+# they were meant to be one
+refid_re = re.compile(r"\+([^ +]*)\(refid=([a-zA-Z0-9]*)\)(?!\(refid=)")
+plus_re = re.compile(r"\+(?![0-9])(?!verb)\w+")
+only_refid_re = re.compile(r"refid")
+id_re = re.compile(r"(?:x|l|kc)nr[a-zA-Z0-9]+")
+
+# All of the above in one pass. Everything is inside a lookahead so that
+# matches can overlap, e.g. an id inside a reference. Only one branch can
+# match at each position, except that a reference hides the plus_re match
+# at its start, which is inside the reference anyway.
+_scan_regexp = re.compile(
+    r"(?=(?P<reference>\+(?P<word>[^ +]*)\(refid=(?P<target>[a-zA-Z0-9]*)\)(?!\(refid=))"
+    r"|(?P<plus>\+(?![0-9])(?!verb)\w+)"
+    r"|(?P<refid>refid)(?:=(?P<refid_target>[a-zA-Z0-9]*))?"
+    r"|(?P<id>(?:x|l|kc)nr[a-zA-Z0-9]+))"
+)
+
+
+@dataclass(frozen=True)
+class ScannedReference:
+    start: int
+    end: int
+    text: str
+    word: str
+    target: str
+
+
+@dataclass(frozen=True)
+class ReferenceScan:
+    # Well-formed references, as found by refid_re
+    references: tuple[ScannedReference, ...] = ()
+    # What follows each "refid=", as found by ref_regexp.findall
+    refids: tuple[str, ...] = ()
+    # Matches of plus_re, only_refid_re and id_re (in that order) that are not
+    # part of a well-formed reference, as (regexp name, start, end, text)
+    malformed: tuple[tuple[str, int, int, str], ...] = ()
+
+    def first_malformed(self, include_ids=True):
+        for kind, _, _, text in self.malformed:
+            if include_ids or kind != "id":
+                return text
+        return None
+
+
+_no_references = ReferenceScan()
+
+
+@lru_cache(maxsize=2**18)
+def scan_references(value: str) -> ReferenceScan:
+    """
+    Find the references in a string, and anything that looks like a
+    malformed reference. Gives the same results as running refid_re,
+    ref_regexp, plus_re, only_refid_re and id_re separately, but only goes
+    through the string once, and the result is shared between all callers.
+    """
+
+    if "+" not in value and "refid" not in value and "nr" not in value:
+        return _no_references
+
+    references = []
+    refids = []
+    candidates = {"plus": [], "refid": [], "id": []}
+    # Where the last match of each regexp ended, to skip overlapping
+    # matches of the same regexp like finditer does
+    ends = {"plus": 0, "refid": 0, "id": 0}
+    last_reference = None
+
+    for match in _scan_regexp.finditer(value):
+        start = match.start()
+        if match.group("reference") is not None:
+            end = match.end("reference")
+            last_reference = ScannedReference(
+                start, end, match.group("reference"), match.group("word"), match.group("target")
+            )
+            references.append(last_reference)
+            continue
+
+        if match.group("refid") is not None:
+            kind = "refid"
+            if match.group("refid_target") is not None:
+                refids.append(match.group("refid_target"))
+        elif match.group("plus") is not None:
+            kind = "plus"
+        else:
+            kind = "id"
+        end = match.end(kind)
+        if start < ends[kind]:
+            continue
+        ends[kind] = end
+        # References don't overlap, so only the last one can contain the match
+        if last_reference is None or last_reference.end < end:
+            candidates[kind].append((kind, start, end, match.group(kind)))
+
+    return ReferenceScan(
+        tuple(references), tuple(refids), tuple(candidates["plus"] + candidates["refid"] + candidates["id"])
+    )
+
 
 def parse_ref(entry, namespace, path):
     value = json.get_path(path, entry.get(namespace.path, {}))
@@ -264,11 +679,65 @@ def parse_ref(entry, namespace, path):
     return Id(namespace, kind, ref), IdLocation(entry, namespace, path, value)
 
 
+def _any_text(markup, pred):
+    return any(pred(node) if isinstance(node, str) else _any_text(node.contents, pred) for node in markup)
+
+
+def _text_reference_items(contents):
+    """
+    Split the contents of an [i ...] element into the comma-separated items
+    that may be references, as (tree, markup) pairs. Gives the same items as
+    parsing each part of to_markup(contents).split(","), leaving out empty
+    items, items that contain "refid=" and items that aren't valid markup
+    by themselves, but works directly on the tree where possible, in which
+    case markup is None.
+    """
+
+    # Commas inside nested tags make items with unbalanced brackets, and
+    # backslashes are the only text that to_markup and parse don't
+    # round-trip exactly. In both cases, do it the slow way.
+    if any(not isinstance(node, str) and _any_text(node.contents, lambda text: "," in text) for node in contents) or (
+        _any_text(contents, lambda text: "\\" in text)
+    ):
+        for item in markup_parser.to_markup(contents).split(","):
+            item = item.strip()
+            if item and not ref_regexp.search(item):
+                try:
+                    tree = markup_parser.parse(item)
+                except lark.LarkError:
+                    continue  # a comma inside a tag
+                yield tree, item
+        return
+
+    items = [[]]
+    for node in contents:
+        if isinstance(node, str):
+            first, *rest = node.split(",")
+            if first:
+                items[-1].append(first)
+            for text in rest:
+                items.append([text] if text else [])
+        else:
+            items[-1].append(node)
+
+    for item in items:
+        if item and isinstance(item[0], str):
+            item[0] = item[0].lstrip()
+            if not item[0]:
+                del item[0]
+        if item and isinstance(item[-1], str):
+            item[-1] = item[-1].rstrip()
+            if not item[-1]:
+                del item[-1]
+        if item and not _any_text(item, lambda text: "refid=" in text):
+            yield item, None
+
+
 def find_text_references(tree_ortografi, tree_homografNr, tree):
     if isinstance(tree, str):
         return
 
-    if isinstance(tree, list):
+    if isinstance(tree, (list, tuple)):
         for subtree in tree:
             yield from find_text_references(tree_ortografi, tree_homografNr, subtree)
         return
@@ -277,21 +746,15 @@ def find_text_references(tree_ortografi, tree_homografNr, tree):
         yield from find_text_references(tree_ortografi, tree_homografNr, tree.contents)
         return
 
-    items = markup_parser.to_markup(tree.contents).split(",")
-
-    for item in items:
-        item = item.strip()
-        if not item:
-            continue
-        if ref_regexp.search(item):
-            continue
-        match markup_parser.parse(item):
+    markup = None
+    for item, item_markup in _text_reference_items(tree.contents):
+        match item:
             case [markup_parser.Element("sup", sup_contents), *rest]:
                 homografNr = int(markup_parser.text_contents(sup_contents))
                 ortografi_xnr = markup_parser.text_contents(rest)
             case _:
                 homografNr = None
-                ortografi_xnr = item
+                ortografi_xnr = item_markup if item_markup is not None else markup_parser.to_markup(item)
 
         maybe_match = text_xnr_regexp.search(ortografi_xnr)
         if maybe_match:
@@ -313,7 +776,9 @@ def find_text_references(tree_ortografi, tree_homografNr, tree):
         if homografNr is None and ortografi == tree_ortografi:
             homografNr = tree_homografNr
 
-        yield markup_parser.to_markup(tree), TextId(ortografi, homografNr)
+        if markup is None:
+            markup = markup_parser.to_markup(tree)
+        yield markup, TextId(ortografi, homografNr)
 
 
 def find_refs_in_namespace(entry, namespace):
@@ -322,8 +787,7 @@ def find_refs_in_namespace(entry, namespace):
     homografNr = body.get("homografNr")
 
     for field, orig_kind in ref_fields[namespace].items():
-        for path in json.expand_path(field, body):
-            orig_ref = json.get_path(path, body)
+        for path, orig_ref in field_accessor(field)(body):
             kind, ref = parse_refid(orig_kind, orig_ref)
             yield Id(namespace, kind, ref), IdLocation(entry, namespace, path, orig_ref)
 
@@ -337,21 +801,17 @@ def find_refs_in_namespace(entry, namespace):
         if not isinstance(value, str):
             continue
 
-        results = ref_regexp.findall(value)
-        for orig_ref in results:
+        for orig_ref in scan_references(value).refids:
             kind, ref = parse_refid(None, orig_ref)
             yield Id(namespace, kind, ref), IdLocation(entry, namespace, path, orig_ref)
 
     for field in freetext_fields[namespace]:
-        for path in json.expand_path(field, body):
-            value = json.get_path(path, body)
-            try:
-                tree = markup_parser.parse(value)
-                for text, ref in find_text_references(ortografi, homografNr, tree):
-                    id = Id(namespace, TEXT, ref)
-                    yield id, IdLocation(entry, namespace, path, text)
-            except lark.LarkError:
-                pass  # TODO: generate warning
+        for path, value in field_accessor(field)(body):
+            # Markup with mistakes in it is reported by test_mismatched_brackets_etc
+            tree, _ = markup_parser.parse_tolerant(value)
+            for text, ref in find_text_references(ortografi, homografNr, tree):
+                id = Id(namespace, TEXT, ref)
+                yield id, IdLocation(entry, namespace, path, text)
 
 
 def find_refs(entry):
@@ -359,7 +819,198 @@ def find_refs(entry):
         yield from find_refs_in_namespace(entry, namespace)
 
 
+ID_INDEX_MAGIC = b"SALEX-ID-INDEX\n"
+ID_INDEX_FORMAT_VERSION = 1
+
+
+def _code_fingerprint():
+    # find_ids lives in this file, so an index made by other code is out of date
+    return hashlib.blake2b(Path(__file__).read_bytes(), digest_size=16).hexdigest()
+
+
+def _entries_fingerprint(entries):
+    ids = "\n".join(str(entry.id) for entry in entries)
+    return hashlib.blake2b(ids.encode(), digest_size=16).hexdigest()
+
+
+class IdIndex:
+    """
+    Where each id is defined, built from find_ids.
+
+    If an id is defined in several places, the best one (a visible one, or
+    in SAOL one not in a variant entry) is used for lookups by id, and
+    `locations` has all of them. Two equally good definitions in different
+    entries end up in `duplicates` as (id, entry, entry2), except for text
+    ids without homografNr, which are expected to clash.
+    """
+
+    def __init__(self, entries, progress=lambda x, desc: x, build=True):
+        self.entries = entries
+        self.best: dict[Id, IdLocation] = {}
+        self.locations: dict[Id, list[IdLocation]] = defaultdict(list)
+        self.duplicates: list[tuple[Id, EntryDto, EntryDto]] = []
+        if build:
+            self._build(progress)
+
+    def _build(self, progress):
+        def better(id, source, target):
+            if source.visible and not target.visible:
+                return True
+            if (
+                id.namespace == SAOL
+                and source.entry.entry.get("ingångstyp") == "variant"
+                and target.entry.entry.get("ingångstyp") != "variant"
+            ):
+                return True
+            return False
+
+        best = self.best
+        for e in progress(self.entries, desc="Finding IDs"):
+            for id, source in find_ids(e):
+                if id.namespace == SAOL and e.entry.get("ingångstyp") == "variant":
+                    continue
+                if id in best:
+                    if better(id, source, best[id]):
+                        best[id] = source
+                        self.locations[id].append(source)
+                    elif better(id, best[id], source):
+                        pass
+                    # missing homografNr are checked by test_references
+                    elif not (id.type == TEXT and id.id.homografNr is None):
+                        self.duplicates.append((id, best[id].entry, e))
+                    else:
+                        self.locations[id].append(source)
+
+                else:
+                    best[id] = source
+                    self.locations[id].append(source)
+
+    def __contains__(self, id):
+        return id in self.best
+
+    def __getitem__(self, id):
+        return self.best[id]
+
+    def get(self, id, default=None):
+        return self.best.get(id, default)
+
+    def by_ortografi(self, namespace, ortografi) -> list[Id]:
+        """The text ids (i.e. the homographs) with the given ortografi."""
+        return self._by_ortografi.get((namespace, ortografi), [])
+
+    def by_entry(self, entry_id) -> list[tuple[Id, IdLocation]]:
+        """The ids defined by an entry, with their locations in that entry."""
+        return self._by_entry.get(entry_id, [])
+
+    @cached_property
+    def _by_ortografi(self):
+        result = defaultdict(list)
+        for id in self.locations:
+            if id.type == TEXT:
+                result[id.namespace, id.id.ortografi].append(id)
+        return dict(result)
+
+    @cached_property
+    def _by_entry(self):
+        result = defaultdict(list)
+        for id, locations in self.locations.items():
+            for loc in locations:
+                result[loc.entry.id].append((id, loc))
+        return dict(result)
+
+    def write(self, path, fingerprint):
+        """
+        Save the index, for the snapshot with the given fingerprint. Entries
+        are stored by their position in self.entries.
+        """
+
+        positions = {id(entry): i for i, entry in enumerate(self.entries)}
+        location_numbers = {}
+        location_table = []
+
+        def number(loc):
+            if id(loc) not in location_numbers:
+                location_numbers[id(loc)] = len(location_table)
+                location_table.append((positions[id(loc.entry)], loc.namespace, loc.path, loc.text))
+            return location_numbers[id(loc)]
+
+        payload = (
+            location_table,
+            [(key, number(loc)) for key, loc in self.best.items()],
+            [(key, [number(loc) for loc in locs]) for key, locs in self.locations.items()],
+            [(key, positions[id(e1)], positions[id(e2)]) for key, e1, e2 in self.duplicates],
+        )
+        header = {
+            "version": ID_INDEX_FORMAT_VERSION,
+            "fingerprint": fingerprint,
+            "entries": _entries_fingerprint(self.entries),
+            "code": _code_fingerprint(),
+        }
+
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as file:
+            file.write(ID_INDEX_MAGIC)
+            pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(payload, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def read(cls, path, fingerprint, entries):
+        """
+        Read an index saved by write(). Returns None if the file doesn't
+        exist or was made for a different snapshot, selection of entries or
+        version of this file.
+        """
+
+        try:
+            with open(path, "rb") as file:
+                if file.read(len(ID_INDEX_MAGIC)) != ID_INDEX_MAGIC:
+                    return None
+                # The header is checked before the (much bigger) payload is read
+                header = pickle.load(file)
+                if (
+                    header.get("version") != ID_INDEX_FORMAT_VERSION
+                    or header.get("fingerprint") != fingerprint
+                    or header.get("entries") != _entries_fingerprint(entries)
+                    or header.get("code") != _code_fingerprint()
+                ):
+                    return None
+                location_table, best, locations, duplicates = pickle.load(file)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return None
+
+        location_table = [
+            IdLocation(entries[position], namespace, path, text) for position, namespace, path, text in location_table
+        ]
+        index = cls(entries, build=False)
+        index.best = {key: location_table[n] for key, n in best}
+        for key, numbers in locations:
+            index.locations[key] = [location_table[n] for n in numbers]
+        index.duplicates = [(key, entries[p1], entries[p2]) for key, p1, p2 in duplicates]
+        return index
+
+    @classmethod
+    def load(cls, path, fingerprint, entries, progress=lambda x, desc: x):
+        """Read the index from path if it is up to date, otherwise build it and save it there."""
+
+        index = cls.read(path, fingerprint, entries)
+        if index is None:
+            index = cls(entries, progress)
+            index.write(path, fingerprint)
+        return index
+
+
+# Names, report cells and sort keys of entries, which are needed by every
+# warning about an entry
+entry_cells = EntryCache()
+
+
 def entry_name(entry, namespace, ref=None):
+    return entry_cells.get(entry, ("name", namespace, ref), lambda: _entry_name(entry, namespace, ref))
+
+
+def _entry_name(entry, namespace, ref):
     if isinstance(ref, Id) and ref.type == TEXT:
         ortografi = ref.id.ortografi
         homografNr = ref.id.homografNr
@@ -380,6 +1031,11 @@ def entry_name(entry, namespace, ref=None):
 
 
 def entry_cell(entry: EntryDto, namespace: Namespace, ref: Id | None = None):
+    """A link to the entry in Karp. The result is shared, so it must not be modified."""
+    return entry_cells.get(entry, ("cell", namespace, ref), lambda: _entry_cell(entry, namespace, ref))
+
+
+def _entry_cell(entry, namespace, ref):
     ortografi = entry.entry["ortografi"]
     quoted_query = quote(f"and(equals|ortografi|{ortografi})")
     url = (
@@ -439,16 +1095,25 @@ class FieldWarning(EntryWarning):
 
 
 def entry_sort_key(entry, namespace):
-    return (entry.entry["ortografi"].lower(), entry_name(entry, namespace))
+    return entry_cells.get(
+        entry, ("sort_key", namespace), lambda: (entry.entry["ortografi"].lower(), entry_name(entry, namespace))
+    )
 
 
 def parse_böjning(entry, namespace, only_alpha=True):
+    parts = derived_data.get(
+        entry, ("böjning", namespace, only_alpha), lambda: tuple(_parse_böjning(entry, namespace, only_alpha))
+    )
+    return list(parts)
+
+
+def _parse_böjning(entry, namespace, only_alpha):
     böjning = entry.entry.get(namespace.path, {}).get("böjning", "")
     match namespace:
         case Namespace.SAOL:
-            parts = [f.text.strip() for f in markup_parser.text_fragments(böjning) if not f.tags]
+            parts = [text.strip() for text, tags in markup_parser.text_runs(böjning) if not tags]
         case Namespace.SO:
-            parts = [f.text.strip() for f in markup_parser.text_fragments(böjning) if f.tags == ["i"]]
+            parts = [text.strip() for text, tags in markup_parser.text_runs(böjning) if tags == ("i",)]
 
     if only_alpha:
         parts = [p for p in parts if p and p[0].isalpha()]
@@ -459,10 +1124,26 @@ def parse_böjning(entry, namespace, only_alpha=True):
     return [simplify(p) for p in parts]
 
 
-def variant_forms(entry, namespace, include_hidden=False, include_main_form=False):
+def variant_forms(entry, namespace, include_hidden=False, include_main_form=False, exclude_fields=()):
+    """
+    The variant forms of an entry. Forms found under any of the top-level
+    fields in exclude_fields (e.g. "vnomen") are left out.
+    """
+
+    forms = derived_data.get(
+        entry,
+        ("variant_forms", namespace, include_hidden, include_main_form, tuple(exclude_fields)),
+        lambda: tuple(_variant_forms(entry, namespace, include_hidden, include_main_form, exclude_fields)),
+    )
+    return iter(forms)
+
+
+def _variant_forms(entry, namespace, include_hidden, include_main_form, exclude_fields):
     for id, loc in text_ids(entry, namespace):
         if not include_hidden and not loc.visible:
             continue
+        if loc.path and loc.path[0] in exclude_fields:
+            continue
 
         if include_main_form or id.id.ortografi != entry.entry["ortografi"]:
             yield id.id.ortografi
@@ -0,0 +1,194 @@
+"""
+Splitting a test run over several machines.
+
+Each shard reads all entries (the indexes and inflection tables are built
+from all of them), but only checks its own part of them, and writes its
+warnings to a shard file. The shard files are then merged into the usual
+reports.
+
+How a test is split depends on what kind of test it is:
+
+* Tests marked with @per_entry or @per_shard produce warnings about one
+  entry at a time, so each shard runs them on its own entries.
+* Tests marked with @map_reduce(map, reduce) are run as `map` on each
+  shard's entries, giving a partial result. `reduce` turns the partial
+  results of all shards into warnings when the shards are merged.
+* Other tests need to see all entries at once. Each of them is run in
+  full by one of the shards, so sharding doesn't speed them up. This
+  includes test_word_segmentation, test_references, test_saol_missing
+  and test_so_definitions: their warnings refer to entries, so they
+  can't be made by a reduce step.
+"""
+
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+import inspect
+import os
+import pickle
+import zlib
+from utils.testing import ReportedWarning
+from utils.timing import StageStatistics, func_name
+
+SHARD_FORMAT_VERSION = 1
+
+# Reduce functions of the tests marked with @map_reduce, by test name
+reducers = {}
+
+
+def per_shard(test):
+    """
+    Decorator marking a test as producing warnings about one entry at a
+    time, so that it can be run on part of the entries. Unlike @per_entry,
+    the test may look at other entries through indexes or inflection
+    tables. The test must have an `entries` argument.
+    """
+
+    test.per_shard = True
+    return test
+
+
+def map_reduce(map_step, reduce_step):
+    """
+    Decorator marking a test as consisting of a map step, which takes the
+    same arguments as the test and returns a (picklable) partial result,
+    and a reduce step, which takes a list of partial results and yields
+    warnings. The warnings can't refer to entries, since the entries
+    aren't available when the shards are merged.
+    """
+
+    def decorate(test):
+        test.map_reduce = (map_step, reduce_step)
+        reducers[test.__name__] = reduce_step
+        return test
+
+    return decorate
+
+
+def _func(test):
+    while isinstance(test, partial):
+        test = test.func
+    return test
+
+
+def with_entries(test, entries):
+    """The test (a partial application of a test function) with its `entries` argument replaced."""
+
+    arguments = inspect.signature(test.func).bind_partial(*test.args, **test.keywords)
+    arguments.arguments["entries"] = entries
+    return partial(test.func, *arguments.args, **arguments.kwargs)
+
+
+@dataclass
+class Shard:
+    index: int
+    count: int
+
+    @classmethod
+    def parse(cls, text):
+        """Parse a shard given as i/N, where 0 <= i < N."""
+
+        try:
+            index, count = (int(x) for x in text.split("/"))
+        except ValueError:
+            raise ValueError(f"shard must be given as i/N, not {text!r}")
+        if not 0 <= index < count:
+            raise ValueError(f"shard {text} doesn't exist: i must be between 0 and N-1")
+        return cls(index, count)
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    @property
+    def filename(self):
+        return f"shard-{self.index}-of-{self.count}.pickle"
+
+    def contains(self, entry):
+        return zlib.crc32(str(entry.id).encode()) % self.count == self.index
+
+    def plan(self, tests, entries):
+        """
+        Work out what this shard does. Returns the tests to run (restricted
+        to the given entries, the shard's own, where possible) and the map
+        steps to run, as (test name, function) pairs.
+        """
+
+        run = []
+        maps = []
+        whole_tests = 0
+        for test in tests:
+            func = _func(test)
+            if hasattr(func, "map_reduce"):
+                map_step, _ = func.map_reduce
+                restricted = with_entries(test, entries)
+                maps.append((func_name(test), partial(map_step, *restricted.args, **restricted.keywords)))
+            elif getattr(func, "per_entry", False) or getattr(func, "per_shard", False):
+                run.append(with_entries(test, entries))
+            else:
+                # Spread the tests that need all entries over the shards
+                if whole_tests % self.count == self.index:
+                    run.append(test)
+                whole_tests += 1
+
+        return run, maps
+
+
+@dataclass
+class ShardResult:
+    shard: Shard
+    # The names of all tests in the run, in order, not just those run by this shard
+    tests: list[str]
+    warnings: dict[str, list[ReportedWarning]] = field(default_factory=dict)
+    partial_results: dict[str, object] = field(default_factory=dict)
+    stages: list[StageStatistics] = field(default_factory=list)
+
+    def write(self, directory):
+        path = Path(directory) / self.shard.filename
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as file:
+            pickle.dump((SHARD_FORMAT_VERSION, self), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def read(cls, path):
+        with open(path, "rb") as file:
+            version, result = pickle.load(file)
+        if version != SHARD_FORMAT_VERSION:
+            raise ValueError(f"{path}: shard file has format version {version}, expected {SHARD_FORMAT_VERSION}")
+        return result
+
+
+def merge_shards(results: list[ShardResult]):
+    """
+    Combine the results of all shards. Returns the warnings, in test order,
+    and the statistics of each shard.
+    """
+
+    if not results:
+        raise ValueError("no shards given")
+
+    count = results[0].shard.count
+    indexes = sorted(result.shard.index for result in results)
+    if any(result.shard.count != count for result in results) or indexes != list(range(count)):
+        shards = ", ".join(str(result.shard) for result in results)
+        raise ValueError(f"expected shards 0/{count} to {count - 1}/{count}, got {shards}")
+    if any(result.tests != results[0].tests for result in results):
+        raise ValueError("the shards were run with different tests")
+
+    results = sorted(results, key=lambda result: result.shard.index)
+    warnings = []
+    for name in results[0].tests:
+        if name in reducers:
+            partial_results = [result.partial_results[name] for result in results]
+            warnings += [ReportedWarning.from_warning(w) for w in reducers[name](partial_results)]
+        else:
+            for result in results:
+                warnings += result.warnings.get(name, [])
+
+    stages = []
+    for result in results:
+        for stats in result.stages:
+            stages.append(StageStatistics(**(vars(stats) | {"stage": f"{stats.stage} (shard {result.shard})"})))
+
+    return warnings, stages
@@ -0,0 +1,111 @@
+"""
+Binary snapshots of Salex, for reloading the entries quickly without
+going through the database.
+
+A snapshot file consists of a magic string, a small header and a pickled
+payload. The header records the format version and a fingerprint of the
+payload, so that snapshots written by an older version of these scripts
+(or truncated files) are detected instead of being silently used. It
+also records when the newest entry was last modified. A snapshot is not
+compared with the database, so it goes on being used after the entries
+change there until it is recreated.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+import hashlib
+import os
+import pickle
+
+MAGIC = b"SALEX-SNAPSHOT\n"
+FORMAT_VERSION = 1
+
+
+class SnapshotError(Exception):
+    pass
+
+
+@dataclass
+class Snapshot:
+    resource_config: object
+    entries: list
+    inflection_rules: list
+    fingerprint: str | None = None
+    created: str | None = None
+    # When the newest entry was last modified, if the entries record it
+    last_modified: float | None = None
+
+
+def fingerprint(payload: bytes) -> str:
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def write_snapshot(path, snapshot: Snapshot):
+    """
+    Write a snapshot to the given path. Sets snapshot.fingerprint,
+    snapshot.created and snapshot.last_modified.
+    """
+
+    payload = pickle.dumps(
+        (snapshot.resource_config, snapshot.entries, snapshot.inflection_rules), protocol=pickle.HIGHEST_PROTOCOL
+    )
+    snapshot.fingerprint = fingerprint(payload)
+    snapshot.created = datetime.now().isoformat(timespec="seconds")
+    snapshot.last_modified = max(
+        (e.last_modified for e in snapshot.entries if getattr(e, "last_modified", None) is not None), default=None
+    )
+    header = {
+        "version": FORMAT_VERSION,
+        "fingerprint": snapshot.fingerprint,
+        "created": snapshot.created,
+        "entries": len(snapshot.entries),
+        "last_modified": snapshot.last_modified,
+    }
+
+    # Write to a temporary file first so that an interrupted write
+    # doesn't leave a broken snapshot behind.
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as file:
+        file.write(MAGIC)
+        pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.write(payload)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot_header(path) -> dict:
+    with open(path, "rb") as file:
+        return _read_header(file, path)
+
+
+def read_snapshot(path) -> Snapshot:
+    with open(path, "rb") as file:
+        header = _read_header(file, path)
+        payload = file.read()
+
+    if fingerprint(payload) != header["fingerprint"]:
+        raise SnapshotError(f"{path}: snapshot is corrupt (fingerprint mismatch)")
+
+    resource_config, entries, inflection_rules = pickle.loads(payload)
+    return Snapshot(
+        resource_config=resource_config,
+        entries=entries,
+        inflection_rules=inflection_rules,
+        fingerprint=header["fingerprint"],
+        created=header["created"],
+        last_modified=header.get("last_modified"),
+    )
+
+
+def _read_header(file, path):
+    if file.read(len(MAGIC)) != MAGIC:
+        raise SnapshotError(f"{path}: not a Salex snapshot")
+
+    header = pickle.load(file)
+    if header.get("version") != FORMAT_VERSION:
+        raise SnapshotError(
+            f"{path}: snapshot has format version {header.get('version')}, expected {FORMAT_VERSION}; "
+            "regenerate it with --refresh-snapshot"
+        )
+    return header
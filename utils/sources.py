@@ -0,0 +1,149 @@
+"""
+Where the entries come from: the Karp database (inside `karp-cli repl`),
+a snapshot (see utils.snapshot) or a JSONL export.
+
+All sources provide the same three things: the resource config, the
+Salex entries and the inflection rules. Entries are EntryDto objects or
+objects with the same attributes.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+from utils.snapshot import Snapshot, read_snapshot, write_snapshot
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+
+@dataclass
+class Entry:
+    """An entry read from a file, with the same attributes as EntryDto."""
+
+    id: str
+    entry: dict
+    resource: str = "salex"
+    version: int | None = None
+    last_modified: float | None = None
+    last_modified_by: str | None = None
+    message: str | None = None
+    discarded: bool = False
+
+
+class EntrySource:
+    def resource_config(self):
+        raise NotImplementedError
+
+    def entries(self) -> Iterator[Entry]:
+        raise NotImplementedError
+
+    def inflection_rules(self) -> Iterator[Entry]:
+        raise NotImplementedError
+
+
+class KarpSource(EntrySource):
+    def __init__(self, entry_queries, resource_queries, resource_id="salex"):
+        self.entry_queries = entry_queries
+        self.resource_queries = resource_queries
+        self.resource_id = resource_id
+
+    def resource_config(self):
+        return self.resource_queries.by_resource_id(self.resource_id, expand_plugins=False).config
+
+    def entries(self):
+        return self.entry_queries.all_entries(self.resource_id, expand_plugins=False)
+
+    def inflection_rules(self):
+        return self.entry_queries.all_entries("inflectionrules")
+
+
+class SnapshotSource(EntrySource):
+    def __init__(self, snapshot: Snapshot):
+        self.snapshot = snapshot
+
+    @classmethod
+    def read(cls, path):
+        return cls(read_snapshot(path))
+
+    @classmethod
+    def create(cls, path, source: EntrySource, progress=lambda x, desc: x):
+        """Read everything from another source and save it as a snapshot."""
+
+        snapshot = Snapshot(
+            resource_config=source.resource_config(),
+            entries=list(progress(source.entries(), desc="Reading entries")),
+            inflection_rules=list(progress(source.inflection_rules(), desc="Reading inflection rules")),
+        )
+        write_snapshot(path, snapshot)
+        return cls(snapshot)
+
+    def resource_config(self):
+        return self.snapshot.resource_config
+
+    def entries(self):
+        return iter(self.snapshot.entries)
+
+    def inflection_rules(self):
+        return iter(self.snapshot.inflection_rules)
+
+
+class JsonlSource(EntrySource):
+    """
+    Reads entries from a JSONL file, one entry per line. Lines can either
+    be entries as exported from Karp (with "id" and "entry" keys) or just
+    the entry body, in which case the position in the file is used as the id.
+
+    The resource config is read from a JSON file, and the inflection rules
+    from a second JSONL file in the same format as the entries.
+    """
+
+    def __init__(self, path, resource_config_path=None, inflection_rules_path=None):
+        self.path = Path(path)
+        self.resource_config_path = resource_config_path
+        self.inflection_rules_path = inflection_rules_path
+
+    def resource_config(self):
+        if self.resource_config_path is None:
+            return None
+
+        # Imported here so that read_jsonl can be used without Karp installed
+        from karp.lex.domain.value_objects import ResourceConfig
+
+        with open(self.resource_config_path, "rb") as file:
+            return ResourceConfig.model_validate(json_loads(file.read()))
+
+    def entries(self):
+        return read_jsonl_entries(self.path)
+
+    def inflection_rules(self):
+        if self.inflection_rules_path is None:
+            return iter(())
+        return read_jsonl_entries(self.inflection_rules_path)
+
+
+def read_jsonl(path) -> Iterator[dict]:
+    """Lazily read the objects in a JSONL file."""
+
+    with open(path, "rb") as file:
+        for line in file:
+            if line.strip():
+                yield json_loads(line)
+
+
+def read_jsonl_entries(path) -> Iterator[Entry]:
+    for i, data in enumerate(read_jsonl(path), start=1):
+        if "entry" in data and "id" in data:
+            yield Entry(
+                id=data["id"],
+                entry=data["entry"],
+                resource=data.get("resource", "salex"),
+                version=data.get("version"),
+                last_modified=data.get("last_modified"),
+                last_modified_by=data.get("last_modified_by"),
+                message=data.get("message"),
+                discarded=data.get("discarded", False),
+            )
+        else:
+            yield Entry(id=str(i), entry=data)
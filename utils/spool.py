@@ -0,0 +1,89 @@
+"""
+An on-disk spool of warnings, so that the warnings of a run don't all have
+to be kept in memory until the reports are made.
+
+Warnings are converted to ReportedWarnings (which don't refer to any
+entries) and stored in an SQLite database as they are produced. The
+reports are then made one category at a time.
+"""
+
+from pathlib import Path
+import os
+import pickle
+import sqlite3
+import tempfile
+from utils.testing import ReportedWarning, TestReport, make_test_report
+
+
+class WarningSpool:
+    """
+    Warnings are added with the position of the test that produced them,
+    and read back in test order (and, within a test, in the order they
+    were added), which is the order make_test_reports expects.
+    """
+
+    def __init__(self, directory, batch_size=1000):
+        fd, path = tempfile.mkstemp(dir=directory, prefix="warnings-", suffix=".sqlite")
+        os.close(fd)
+        self.path = Path(path)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("CREATE TABLE warnings (test INTEGER, collection TEXT, category TEXT, data BLOB)")
+        self.db.execute("CREATE INDEX warnings_by_category ON warnings (collection, category)")
+        self.batch = []
+        self.batch_size = batch_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.db.close()
+        self.path.unlink(missing_ok=True)
+
+    def add(self, test, warning):
+        warning = ReportedWarning.from_warning(warning)
+        self.batch.append(
+            (test, warning.collection(), warning.category(), pickle.dumps(warning, protocol=pickle.HIGHEST_PROTOCOL))
+        )
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def add_all(self, test, warnings):
+        for warning in warnings:
+            self.add(test, warning)
+
+    def flush(self):
+        self.db.executemany("INSERT INTO warnings VALUES (?, ?, ?, ?)", self.batch)
+        self.db.commit()
+        self.batch = []
+
+    def test_warnings(self, test) -> list[ReportedWarning]:
+        self.flush()
+        rows = self.db.execute("SELECT data FROM warnings WHERE test = ? ORDER BY rowid", (test,))
+        return [pickle.loads(data) for (data,) in rows]
+
+    def category_warnings(self, collection, category) -> list[ReportedWarning]:
+        self.flush()
+        rows = self.db.execute(
+            "SELECT data FROM warnings WHERE collection = ? AND category = ? ORDER BY test, rowid",
+            (collection, category),
+        )
+        return [pickle.loads(data) for (data,) in rows]
+
+    def make_test_reports(self) -> dict[str, dict[str, TestReport]]:
+        """Like make_test_reports, but only reading in one category of warnings at a time."""
+
+        self.flush()
+        categories = sorted(
+            self.db.execute(
+                "SELECT DISTINCT collection, category FROM warnings "
+                "WHERE collection IS NOT NULL AND category IS NOT NULL"
+            )
+        )
+
+        result = {}
+        for collection, category in categories:
+            result.setdefault(collection, {})[category] = make_test_report(self.category_warnings(collection, category))
+        return result
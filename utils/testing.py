@@ -38,6 +38,9 @@ class TestWarning:
     def extra_fields(self) -> set[str]:
         return set()
 
+    def type_name(self) -> str:
+        return type(self).__name__
+
 
 def diff_warnings(tester, w1, w2):
     identifiers = {tester.info.identifier(w) for w in w2}
@@ -221,39 +224,41 @@ def highlight(part, text, case_sensitive=True):
 
 
 def markup_cell(markup):
+    parts = []
     try:
-        _tree = markup_parser.parse(markup)
+        for text, tags in markup_parser.text_runs(markup):
+            parts.append(_markup_style(tags))
+            parts.append(text.upper() if "caps" in tags else text)
     except lark.LarkError:
         return markup
 
-    parts = []
-    for fragment in markup_parser.text_fragments(markup):
-        style = Style()
-        for tag in fragment.tags:
-            match tag:
-                case "b":
-                    style = replace(style, bold=True)
-                case "i":
-                    style = replace(style, italic=True)
-                case "u":
-                    style = replace(style, underline=True)
-                case "caps":
-                    fragment.text = fragment.text.upper()
-                    style = replace(style, small=True)
-                case "r":
-                    style = Style()
-                case "rp":
-                    style = Style(small=True)
-                case "sup":
-                    style = replace(style, superscript=True)
-                case "sub":
-                    style = replace(style, subscript=True)
-        parts.append(style)
-        parts.append(fragment.text)
-
     return rich_string_cell(*parts)
 
 
+@lru_cache(maxsize=None)
+def _markup_style(tags):
+    style = Style()
+    for tag in tags:
+        match tag:
+            case "b":
+                style = replace(style, bold=True)
+            case "i":
+                style = replace(style, italic=True)
+            case "u":
+                style = replace(style, underline=True)
+            case "caps":
+                style = replace(style, small=True)
+            case "r":
+                style = Style()
+            case "rp":
+                style = Style(small=True)
+            case "sup":
+                style = replace(style, superscript=True)
+            case "sub":
+                style = replace(style, subscript=True)
+    return style
+
+
 @dataclass
 class _Link:
     text: object
@@ -304,8 +309,74 @@ class TestReport:
     rows: list[list[object]]
 
 
+def to_cell(value):
+    """Apply the write-via handlers to a value, like writing it to a cell would."""
+
+    while type(value) in _write_vias:
+        value = _write_vias[type(value)](value)
+    return value
+
+
+@dataclass(frozen=True)
+class ReportedWarning(TestWarning):
+    """
+    A warning that has already been converted to the form it has in the
+    report. It doesn't refer to any entries, so it is cheap to pickle,
+    e.g. to send it from one process to another.
+    """
+
+    kind: str
+    _collection: str | None
+    _category: str | None
+    _sort_key: tuple
+    fields: dict[str, object]
+    _extra_fields: frozenset[str]
+    # The id of the entry the warning is about, if any
+    entry_id: object = None
+
+    @classmethod
+    def from_warning(cls, warning: TestWarning) -> "ReportedWarning":
+        if isinstance(warning, ReportedWarning):
+            return warning
+
+        return cls(
+            kind=warning.type_name(),
+            _collection=warning.collection(),
+            _category=warning.category(),
+            _sort_key=warning.sort_key(),
+            fields={k: to_cell(v) for k, v in warning.to_dict().items()},
+            _extra_fields=frozenset(warning.extra_fields()),
+            entry_id=warning_entry_id(warning),
+        )
+
+    def collection(self):
+        return self._collection
+
+    def category(self):
+        return self._category
+
+    def to_dict(self):
+        return self.fields
+
+    def sort_key(self):
+        return self._sort_key
+
+    def extra_fields(self):
+        return set(self._extra_fields)
+
+    def type_name(self):
+        return self.kind
+
+
+def warning_entry_id(warning):
+    if isinstance(warning, ReportedWarning):
+        return warning.entry_id
+    entry = getattr(warning, "entry", None)
+    return getattr(entry, "id", None)
+
+
 def make_test_report(warnings) -> TestReport:
-    warnings.sort(key=lambda w: (type(w).__name__, w.sort_key()))
+    warnings.sort(key=lambda w: (w.type_name(), w.sort_key()))
 
     fields = ["Kommentar"]
     extra_fields = ["Kommentar"]
@@ -0,0 +1,140 @@
+"""
+Measuring how long each stage of a test run takes and how much memory it uses.
+
+The measurements end up in a "Körningsstatistik" sheet of the test report
+and in a JSON file next to the reports.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from functools import partial
+from pathlib import Path
+from time import perf_counter, process_time
+import json
+import resource
+from utils.testing import TestWarning
+from utils.markup_parser import parse_cache_statistics
+
+
+def func_name(func):
+    if isinstance(func, partial):
+        return func_name(func.func)
+    else:
+        return func.__name__
+
+
+def peak_rss():
+    """The peak resident set size of this process so far, in kilobytes (on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+@dataclass
+class StageStatistics:
+    stage: str
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    # How much the peak RSS (in kilobytes) grew during the stage. Zero if
+    # the stage didn't use more memory than earlier stages.
+    peak_rss_increase: int = 0
+    warnings: int | None = None
+    # Lookups in the markup parse cache (see utils.markup_parser) during the stage
+    parse_cache_hits: int = 0
+    parse_cache_misses: int = 0
+
+
+@contextmanager
+def measure(stage):
+    """Measure the code in a with-block. CPU time is for this process only."""
+
+    stats = StageStatistics(stage)
+    start_wall = perf_counter()
+    start_cpu = process_time()
+    start_rss = peak_rss()
+    start_cache = parse_cache_statistics()
+    try:
+        yield stats
+    finally:
+        stats.wall_time = perf_counter() - start_wall
+        stats.cpu_time = process_time() - start_cpu
+        stats.peak_rss_increase = peak_rss() - start_rss
+        end_cache = parse_cache_statistics()
+        stats.parse_cache_hits = end_cache["hits"] - start_cache["hits"]
+        stats.parse_cache_misses = end_cache["misses"] - start_cache["misses"]
+
+
+def run_test(test, sink=None):
+    """
+    Run a test, returning its warnings and statistics. If `sink` is given,
+    each warning is passed to it as soon as the test yields it, instead of
+    being collected, and the returned warnings are None.
+    """
+
+    with measure(func_name(test)) as stats:
+        if sink is None:
+            warnings = list(test())
+            stats.warnings = len(warnings)
+        else:
+            warnings = None
+            stats.warnings = 0
+            for warning in test():
+                sink(warning)
+                stats.warnings += 1
+    return warnings, stats
+
+
+@dataclass(frozen=True)
+class StageWarning(TestWarning):
+    position: int
+    stage: str
+    wall_time: float
+    cpu_time: float
+    peak_rss_increase: int
+    warnings: int | None
+    parse_cache_hits: int = 0
+    parse_cache_misses: int = 0
+
+    def category(self):
+        return "Körningsstatistik"
+
+    def to_dict(self):
+        lookups = self.parse_cache_hits + self.parse_cache_misses
+        return {
+            "Steg": self.stage,
+            "Tid (s)": round(self.wall_time, 2),
+            "CPU-tid (s)": round(self.cpu_time, 2),
+            "Ökning av max-RSS (MB)": round(self.peak_rss_increase / 1024, 1),
+            "Varningar": self.warnings,
+            "Träffar i markup-cachen (%)": round(100 * self.parse_cache_hits / lookups, 1) if lookups else None,
+        }
+
+    def sort_key(self):
+        return (self.position,)
+
+
+class RunStatistics:
+    def __init__(self, jobs=1):
+        self.stages: list[StageStatistics] = []
+        self.jobs = jobs
+
+    @contextmanager
+    def measure(self, stage):
+        with measure(stage) as stats:
+            yield stats
+        self.stages.append(stats)
+
+    def add(self, stats):
+        self.stages.append(stats)
+
+    def warnings(self):
+        return [StageWarning(i, **asdict(stats)) for i, stats in enumerate(self.stages)]
+
+    def write_json(self, path):
+        data = {
+            "jobs": self.jobs,
+            "max_rss_kb": peak_rss(),
+            # Only counts the lookups made in this process, not in workers
+            "parse_cache": parse_cache_statistics(),
+            "stages": [asdict(stats) for stats in self.stages],
+        }
+        with open(Path(path), "w") as file:
+            json.dump(data, file, indent=2, ensure_ascii=False)
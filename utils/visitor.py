@@ -0,0 +1,188 @@
+"""
+Walking over the fields of all entries once, on behalf of several tests.
+
+Many tests look at every string in an entry. Instead of each of them
+walking over all entries with json.all_paths, they define a LeafCheck,
+which is called for each leaf (string, number etc.) of an entry, and get
+their warnings from an EntryWalk, which walks over the entries once for
+all the checks it has been given.
+"""
+
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Callable, Iterable
+from karp.foundation import json
+from tqdm import tqdm
+from utils.salex import SO, SAOL, Namespace, entry_is_visible
+from utils.testing import TestWarning
+
+namespaces_by_path = {namespace.path: namespace for namespace in [SO, SAOL]}
+
+
+@dataclass
+class Leaf:
+    entry: object
+    namespace: Namespace | None
+    # The path relative to the namespace body (or to the entry, for
+    # fields outside SO and SAOL).
+    path: list
+    value: object
+    # The length of the path (from the root of the entry) of the innermost
+    # invisible dict containing the leaf, or -1 if there is none.
+    hidden_depth: int
+
+    @property
+    def visible(self):
+        """Like is_visible(path, body), where body is the namespace body (or the entry)."""
+        return self.hidden_depth < (0 if self.namespace is None else 1)
+
+    @property
+    def visible_in_entry(self):
+        """Like is_visible(path, entry.entry) for the full path of the leaf."""
+        return self.hidden_depth < 0
+
+    @property
+    def full_path(self):
+        return self.path if self.namespace is None else [self.namespace.path] + self.path
+
+    @cached_property
+    def field(self):
+        return json.path_str(self.path, strip_positions=True)
+
+
+@dataclass(frozen=True)
+class LeafCheck:
+    check: Callable[[Leaf], Iterable[TestWarning]]
+    # If given, only leaves in these namespaces (None meaning fields
+    # outside SO and SAOL) are checked, and the warnings for each entry
+    # come out grouped by namespace in this order. Otherwise all leaves
+    # are checked, in the order they occur in the entry.
+    namespaces: tuple[Namespace | None, ...] | None = None
+    visible_only: bool = True
+    strings_only: bool = True
+
+    def wants(self, namespace, value, hidden_depth):
+        if self.namespaces is not None and namespace not in self.namespaces:
+            return False
+        if self.strings_only and not isinstance(value, str):
+            return False
+        if self.visible_only and hidden_depth >= (0 if namespace is None else 1):
+            return False
+        return True
+
+
+def leaf_check(namespaces=None, visible_only=True, strings_only=True):
+    """Decorator turning a function from Leaf to warnings into a LeafCheck."""
+
+    def decorate(check):
+        return LeafCheck(
+            check,
+            namespaces=None if namespaces is None else tuple(namespaces),
+            visible_only=visible_only,
+            strings_only=strings_only,
+        )
+
+    return decorate
+
+
+def walks(*checks):
+    """Decorator marking a test as getting its warnings from these LeafChecks."""
+
+    def decorate(test):
+        test.leaf_checks = checks
+        return test
+
+    return decorate
+
+
+def walk_leaves(data, visit, test=entry_is_visible):
+    """
+    Call visit(path, value, hidden_depth) for every leaf of data, in the
+    same order as json.all_paths. The path is reused between calls, so
+    visit must copy it if it keeps it.
+    """
+
+    path = []
+
+    def walk(value, hidden_depth):
+        if isinstance(value, dict):
+            if not test(value):
+                hidden_depth = len(path)
+            for key, child in value.items():
+                path.append(key)
+                walk(child, hidden_depth)
+                path.pop()
+        elif isinstance(value, list):
+            for i, child in enumerate(value):
+                path.append(i)
+                walk(child, hidden_depth)
+                path.pop()
+        else:
+            visit(path, value, hidden_depth)
+
+    walk(data, -1)
+
+
+@dataclass
+class EntryWalk:
+    entries: list
+    pending: list[LeafCheck] = field(default_factory=list)
+    results: dict[LeafCheck, list[TestWarning]] = field(default_factory=dict)
+
+    def add(self, *checks):
+        for check in checks:
+            if check not in self.pending and check not in self.results:
+                self.pending.append(check)
+
+    def add_for_test(self, test):
+        """Add the checks of a test marked with @walks (or a partial application of one)."""
+
+        while hasattr(test, "func"):
+            test = test.func
+        self.add(*getattr(test, "leaf_checks", ()))
+
+    def warnings(self, check):
+        """The warnings of a check. Walks over the entries if needed."""
+
+        if check not in self.results:
+            self.add(check)
+            self.run()
+        return self.results.pop(check)
+
+    def run(self):
+        """Run all pending checks, in a single walk over the entries."""
+
+        checks = self.pending
+        self.pending = []
+        if not checks:
+            return
+
+        results = {check: [] for check in checks}
+        buffers = {}
+
+        def visit(path, value, hidden_depth):
+            namespace = namespaces_by_path.get(path[0]) if path else None
+            leaf = None
+            for check in checks:
+                if not check.wants(namespace, value, hidden_depth):
+                    continue
+                if leaf is None:
+                    leaf = Leaf(
+                        entry, namespace, path[1:] if namespace is not None else list(path), value, hidden_depth
+                    )
+                # Checks without namespaces get one buffer for the whole entry
+                key = namespace if check.namespaces is not None else None
+                buffers[check, key].extend(check.check(leaf))
+
+        for entry in tqdm(self.entries, desc="Checking fields"):
+            for check in checks:
+                for namespace in check.namespaces or [None]:
+                    buffers[check, namespace] = []
+
+            walk_leaves(entry.entry, visit)
+
+            for check in checks:
+                for namespace in check.namespaces or [None]:
+                    results[check] += buffers[check, namespace]
+
+        self.results.update(results)